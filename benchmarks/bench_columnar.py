@@ -0,0 +1,35 @@
+import sys
+import time
+import argparse
+import pathlib
+import tracemalloc
+
+from ftnt_log_parser.common import LogLoader
+
+
+def measure(file: pathlib.Path, columnar: bool, fields: list = None):
+    start = time.perf_counter()
+    LogLoader.file_to_df(file=file, columnar=columnar, fields=fields)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    df = LogLoader.file_to_df(file=file, columnar=columnar, fields=fields)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return df, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare time and peak memory of row based, columnar and projected file_to_df")
+    parser.add_argument('-i', '--input-file', dest='input_file', type=pathlib.Path, required=True)
+    parser.add_argument('--fields', type=lambda x: x.split(','), default=['srcip', 'srccountry', '@timestamp', 'action', 'dstport'])
+    args = parser.parse_args()
+
+    for columnar, fields in ((False, None), (True, None), (True, args.fields)):
+        df, peak, elapsed = measure(file=args.input_file, columnar=columnar, fields=fields)
+        size = df.memory_usage(deep=True).sum()
+        print(f"columnar={columnar!s:>5} fields={len(fields) if fields else 'all':>3}: rows {len(df)}, {elapsed:>6.2f} s, peak {peak / 2**20:>8.1f} MiB, frame {size / 2**20:>8.1f} MiB", file=sys.stderr)
+        del df
+
+
+if __name__ == '__main__':
+    main()
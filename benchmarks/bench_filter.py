@@ -0,0 +1,41 @@
+import sys
+import time
+import random
+import argparse
+
+from ftnt_log_parser.common import LogLoader
+from ftnt_log_parser.filters import LogFilter
+
+SAMPLE_LINE = 'date=2024-05-{:02d} time=10:15:01 devname="FGT-{:02d}" devid="FG100FTK00000000" eventtime=1716192901123456789 tz="+0200" logid="0000000013" type="{}" subtype="forward" level="notice" vd="root" srcip=10.0.{}.{} srcport={} dstip=93.184.216.34 dstport={} sessionid={} proto=6 action="{}" policyid=1 duration={} sentbyte={} rcvdbyte={}'
+
+
+def make_lines(count: int) -> list:
+    rnd = random.Random(1)
+    return [SAMPLE_LINE.format(18 + i * 7 // count, rnd.randrange(20), rnd.choice(['traffic', 'traffic', 'traffic', 'utm', 'event']), i % 256, i % 200, 40000 + i % 20000, rnd.choice([53, 80, 443, 8080]), i, rnd.choice(['accept', 'accept', 'close', 'timeout', 'deny']), i % 300, i * 7 % 100000, i * 13 % 1000000) for i in range(count)]
+
+
+def bench(name: str, func) -> float:
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:>60}: {count} records in {elapsed:.2f} s", file=sys.stderr)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare filtering with and without substring prefilter")
+    parser.add_argument('--lines', type=int, default=500000)
+    parser.add_argument('--filters', nargs='*', default=['type=traffic action=deny', 'devname=FGT-07', 'type=utm @timestamp>=2024-05-20 @timestamp<2024-05-21', 'dstport>=1024'])
+    args = parser.parse_args()
+
+    lines = make_lines(count=args.lines)
+    baseline = bench("parse all lines", lambda: sum(1 for _ in LogLoader.re_parse_lines(lines=lines)))
+    for expression in args.filters:
+        log_filter = LogFilter.parse(expression=expression)
+        bench(f"{expression} (parse, then match)", lambda: sum(1 for x in LogLoader.re_parse_lines(lines=lines) if log_filter.match(x)))
+        elapsed = bench(f"{expression} (prefilter)", lambda: sum(1 for _ in LogLoader.re_parse_lines(lines=lines, log_filter=log_filter)))
+        print(f"{'':>60}  {baseline / elapsed:.2f}x", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import os
+import sys
+import gzip
+import time
+import argparse
+import pathlib
+import tempfile
+
+from ftnt_log_parser.common import LogLoader
+
+SAMPLE_LINE = 'date=2024-05-20 time=10:15:01 devname="FGT-01" devid="FG100FTK00000000" eventtime=1716192901123456789 tz="+0200" logid="0000000013" type="traffic" subtype="forward" level="notice" vd="root" srcip=10.0.{}.{} srcport={} dstip=93.184.216.34 dstport=443 sessionid={} proto=6 action="accept" policyid=1 duration={} sentbyte={} rcvdbyte={}'
+
+
+def make_file(path: pathlib.Path, lines: int, members: int):
+    # Concatenated members, as produced by log rotation appending to the same archive
+    per_member = lines // members
+    with path.open(mode='wb') as f:
+        for member in range(members):
+            start = member * per_member
+            data = '\n'.join(SAMPLE_LINE.format(i % 256, i % 200, 40000 + i % 20000, i, i % 300, i * 7 % 100000, i * 13 % 1000000) for i in range(start, start + per_member))
+            f.write(gzip.compress((data + '\n').encode('utf-8'), compresslevel=6))
+
+
+def bench(name: str, lines, size: int) -> float:
+    start = time.perf_counter()
+    count = sum(1 for _ in lines)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>20}: {count} lines in {elapsed:.2f} s, {size / elapsed / 2**20:.1f} MiB/s compressed", file=sys.stderr)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single stream and parallel multi-member gzip reading")
+    parser.add_argument('-i', '--input-file', dest='input_file', type=pathlib.Path, help="Gzip log file to use instead of generated one")
+    parser.add_argument('--lines', type=int, default=1000000)
+    parser.add_argument('--members', type=int, default=32)
+    parser.add_argument('--workers', type=int, nargs='*', default=[2, 4, os.cpu_count()])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.input_file
+        if path is None:
+            path = pathlib.Path(tmp).joinpath("bench.log.gz")
+            make_file(path=path, lines=args.lines, members=args.members)
+        size = path.stat().st_size
+        baseline = bench("gzip.GzipFile", LogLoader.read_gzip(file=path), size=size)
+        for workers in sorted(set(args.workers)):
+            elapsed = bench(f"parallel {workers} workers", LogLoader.read_lines(file=path, decompress_workers=workers), size=size)
+            print(f"{'':>20}  {baseline / elapsed:.2f}x", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
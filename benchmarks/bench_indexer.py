@@ -0,0 +1,51 @@
+import sys
+import timeit
+import argparse
+from elasticsearch import Elasticsearch
+
+from ftnt_log_parser.elasticsearch_indexer import ElasticIndexer
+from ftnt_log_parser.async_indexer import AsyncElasticIndexer
+from mock_elasticsearch import start_server
+
+SAMPLE_DOC = {
+    "date": "2024-05-20", "time": "10:15:01", "devname": "FGT-01", "devid": "FG100FTK00000000",
+    "logid": "0000000013", "type": "traffic", "subtype": "forward", "level": "notice", "vd": "root",
+    "srcip": "10.0.0.10", "srcport": "51234", "srcintf": "internal", "dstip": "93.184.216.34",
+    "dstport": "443", "dstintf": "wan1", "sessionid": "123456", "proto": "6", "action": "accept",
+    "policyid": "1", "service": "HTTPS", "dstcountry": "United States", "srccountry": "Reserved",
+    "duration": "12", "sentbyte": "2345", "rcvdbyte": "12345", "sentpkt": "10", "rcvdpkt": "12",
+}
+
+
+def run(indexer: ElasticIndexer, method: str, count: int, **kwargs) -> float:
+    data = (dict(SAMPLE_DOC, sessionid=str(i)) for i in range(count))
+    start = timeit.default_timer()
+    getattr(indexer, method)(data=data, total_records=count, **kwargs)
+    return count / (timeit.default_timer() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-document and bulk indexing, threads and asyncio, against a mock Elasticsearch")
+    parser.add_argument('--count', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=20, help="Concurrent per-document requests, bulk uses 4")
+    args = parser.parse_args()
+
+    server = start_server()
+    hosts = f"http://127.0.0.1:{server.server_address[1]}"
+    indexer = ElasticIndexer(client=Elasticsearch(hosts=hosts), index_name="bench")
+    async_indexer = AsyncElasticIndexer(client_options=dict(hosts=hosts), index_name="bench")
+
+    results = {
+        "threads index_data": run(indexer, "index_data", count=args.count, max_workers=args.workers),
+        "threads bulk_index_data": run(indexer, "bulk_index_data", count=args.count),
+        "async index_data": run(async_indexer, "index_data", count=args.count, max_workers=args.workers),
+        "async bulk_index_data": run(async_indexer, "bulk_index_data", count=args.count),
+    }
+    single = results["threads index_data"]
+    for name, rate in results.items():
+        print(f"{name:>24}: {rate:>12.0f} docs/s ({rate / single:.1f}x)", file=sys.stderr)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
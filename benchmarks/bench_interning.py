@@ -0,0 +1,58 @@
+import sys
+import time
+import argparse
+import pathlib
+import tracemalloc
+
+from ftnt_log_parser.common import LogLoader
+from ftnt_log_parser.interning import Interner, RecordCompactor, compact_records_to_df
+
+SAMPLE_LINE = 'date=2024-05-20 time=10:{:02d}:{:02d} devname="FGT-01" devid="FG100FTK00000000" eventtime=1716192901123456789 tz="+0200" logid="0000000013" type="traffic" subtype="forward" level="notice" vd="root" srcip=10.0.{}.{} srcport={} srcintf="port1" srcintfrole="lan" dstip=93.184.216.34 dstport={} dstintf="wan1" dstintfrole="wan" srccountry="Reserved" dstcountry="United States" sessionid={} proto=6 action="{}" policyid=1 policytype="policy" poluuid="a1b2c3d4-0000-1111-2222-333344445555" policyname="LAN-out" service="HTTPS" trandisp="snat" transip=1.2.3.4 transport={} appid=40568 app="HTTPS.BROWSER" appcat="Web.Client" apprisk="medium" applist="default" duration={} sentbyte={} rcvdbyte={} sentpkt=6 rcvdpkt=7 vwlid=0 srcmac="00:11:22:33:44:55" mastersrcmac="00:11:22:33:44:55" srcserver=0 osname="Windows" devtype="Windows PC" dstdevtype="Router" masterdstmac="00:aa:bb:cc:dd:ee" dstmac="00:aa:bb:cc:dd:ee" dstserver=0 utmaction="allow" countapp=1'
+
+
+def make_lines(count: int) -> list:
+    return [SAMPLE_LINE.format(i // 6000 % 60, i // 100 % 60, i % 256, i % 199, 40000 + i % 20000, (53, 80, 443)[i % 3], i, ('accept', 'deny', 'close')[i % 3], 30000 + i % 30000, i % 300, i * 7 % 100000, i * 13 % 1000000) for i in range(count)]
+
+
+def parse(lines: list, stage=None) -> list:
+    entries = LogLoader.re_parse_lines(lines=lines)
+    if stage is not None:
+        entries = map(stage, entries)
+    return list(entries)
+
+
+def measure(name: str, lines: list, stage=None):
+    start = time.perf_counter()
+    parse(lines=lines, stage=stage)
+    elapsed = time.perf_counter() - start
+    # Lines are created before tracing starts, only the retained records are counted
+    tracemalloc.start()
+    records = parse(lines=lines, stage=stage)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_million = current / len(records) * 1e6 / 2**20
+    print(f"{name:>24}: {per_million:>8.0f} MiB per million records, {current / len(records):>6.0f} B per record, {elapsed:.2f} s", file=sys.stderr)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory held by parsed records as dicts, interned dicts and compact records")
+    parser.add_argument('-i', '--input-file', dest='input_file', type=pathlib.Path, help="Plaintext log file to use instead of generated lines")
+    parser.add_argument('--records', type=int, default=200000)
+    args = parser.parse_args()
+
+    if args.input_file is not None:
+        lines = list(LogLoader.head(LogLoader.read_lines(file=args.input_file), count=args.records))
+    else:
+        lines = make_lines(count=args.records)
+    measure("dict", lines)
+    measure("interned keys", lines, Interner(value_fields=set()))
+    measure("interned keys, values", lines, Interner())
+    records = measure("compact records", lines, RecordCompactor(interner=Interner()))
+    start = time.perf_counter()
+    df = compact_records_to_df(records)
+    print(f"{'compact to DataFrame':>24}: {df.shape} in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
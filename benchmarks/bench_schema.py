@@ -0,0 +1,46 @@
+import sys
+import time
+import argparse
+import pathlib
+import tracemalloc
+
+import pandas as pd
+
+from ftnt_log_parser.common import LogLoader
+from ftnt_log_parser.schemas import SchemaRegistry
+from bench_interning import make_lines
+
+
+def parse(lines: list, schema: SchemaRegistry = None) -> list:
+    return list(LogLoader.re_parse_lines(lines=lines, schema=schema))
+
+
+def measure(name: str, lines: list, schema: SchemaRegistry = None):
+    start = time.perf_counter()
+    parse(lines=lines, schema=schema)
+    elapsed = time.perf_counter() - start
+    # Separate traced run, tracemalloc slows parsing down
+    tracemalloc.start()
+    records = parse(lines=lines, schema=schema)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    df = pd.DataFrame.from_records(data=records)
+    print(f"{name:>12}: {elapsed:.2f} s, {current / len(records):>6.0f} B per record, DataFrame {df.memory_usage(deep=True).sum() / 2**20:.1f} MiB", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare parsing with and without schema conversion")
+    parser.add_argument('-i', '--input-file', dest='input_file', type=pathlib.Path, help="Plaintext log file to use instead of generated lines")
+    parser.add_argument('--records', type=int, default=200000)
+    args = parser.parse_args()
+
+    if args.input_file is not None:
+        lines = list(LogLoader.head(LogLoader.read_lines(file=args.input_file), count=args.records))
+    else:
+        lines = make_lines(count=args.records)
+    measure("strings", lines)
+    measure("schema", lines, SchemaRegistry())
+
+
+if __name__ == '__main__':
+    main()
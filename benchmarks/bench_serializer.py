@@ -0,0 +1,55 @@
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+
+from ftnt_log_parser.common import LogLoader
+from ftnt_log_parser.serializers import OUTPUT_FORMATS, serialize, write_output
+
+SAMPLE_LINE = 'date=2024-05-20 time=10:{:02d}:{:02d} devname="FGT-01" devid="FG100FTK00000000" eventtime=1716192901123456789 tz="+0200" logid="0000000013" type="traffic" subtype="forward" level="notice" vd="root" srcip=10.0.{}.{} srcport={} dstip=93.184.216.34 dstport=443 sessionid={} proto=6 action="accept" policyid=1 duration={} sentbyte={} rcvdbyte={}'
+
+
+def make_entries(count: int) -> list:
+    lines = [SAMPLE_LINE.format(i // 6000 % 60, i // 100 % 60, i % 256, i % 200, 40000 + i % 20000, i, i % 300, i * 7 % 100000, i * 13 % 1000000) for i in range(count)]
+    return list(LogLoader.add_timestamp(entries=LogLoader.re_parse_lines(lines=lines)))
+
+
+def print_lines(entries: list, stream) -> int:
+    # Previous flp read --format json: json.dumps and print per record
+    written = 0
+    with contextlib.redirect_stdout(stream):
+        for line in (json.dumps(x, default=str) for x in entries):
+            print(line)
+            written += len(line) + 1
+    return written
+
+
+def bench(name: str, func) -> float:
+    start = time.perf_counter()
+    written = func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:>20}: {written / 2**20:.1f} MiB in {elapsed:.2f} s, {written / elapsed / 2**20:.1f} MiB/s", file=sys.stderr)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-record print with batched serializer output, written to /dev/null")
+    parser.add_argument('--records', type=int, default=200000)
+    parser.add_argument('--formats', nargs='*', choices=OUTPUT_FORMATS, default=['ndjson', 'json-pretty', 'csv', 'bulk'])
+    args = parser.parse_args()
+
+    entries = make_entries(count=args.records)
+    with open(os.devnull, mode='w') as devnull:
+        baseline = bench("print json.dumps", lambda: print_lines(entries=[dict(x) for x in entries], stream=devnull))
+    for format in args.formats:
+        # serialize formats timestamps in place, each run gets fresh copies
+        copies = [dict(x) for x in entries]
+        with open(os.devnull, mode='wb') as devnull:
+            elapsed = bench(format, lambda: write_output(chunks=serialize(entries=copies, format=format), stream=devnull))
+        print(f"{'':>20}  {baseline / elapsed:.2f}x", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
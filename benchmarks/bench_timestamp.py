@@ -0,0 +1,55 @@
+import sys
+import timeit
+import datetime
+import argparse
+
+from ftnt_log_parser.timestamps import TimestampParser
+
+DEFAULT_TIMEZONE = datetime.timezone(datetime.timedelta(hours=1))
+
+
+def strptime_timestamp(entry: dict) -> datetime.datetime:
+    # Previous LogLoader.add_timestamp implementation
+    entry_keys = list(entry.keys())
+    tzinfo = None
+    if 'tz' in entry_keys:
+        tzinfo = datetime.datetime.strptime(entry['tz'], '%z').tzinfo
+    timestamp = datetime.datetime.strptime(f"{entry['date']}_{entry['time']}", "%Y-%m-%d_%H:%M:%S")
+    if tzinfo is not None:
+        timestamp = timestamp.replace(tzinfo=tzinfo)
+    else:
+        timestamp = timestamp.replace(tzinfo=DEFAULT_TIMEZONE)
+    return timestamp
+
+
+def make_entries(count: int, per_second: int) -> list:
+    start = datetime.datetime(2024, 5, 20, 10, 0, 0)
+    entries = []
+    for i in range(count):
+        ts = start + datetime.timedelta(seconds=i // per_second)
+        entries.append({"date": ts.strftime("%Y-%m-%d"), "time": ts.strftime("%H:%M:%S"), "tz": "+0200", "eventtime": str(int(ts.timestamp()) * 10**9)})
+    return entries
+
+
+def bench(func, entries: list, repeat: int = 5) -> float:
+    best = min(timeit.repeat(lambda: [func(x) for x in entries], number=1, repeat=repeat))
+    return best / len(entries) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-record cost of timestamp construction")
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--per-second', type=int, default=20, help="Records sharing the same second")
+    args = parser.parse_args()
+
+    entries = make_entries(count=args.count, per_second=args.per_second)
+    results = {"strptime": bench(strptime_timestamp, entries)}
+    for name, options in {"cached datetime": {}, "cached epoch_millis": {"output": "epoch_millis"}, "eventtime": {"prefer_epoch": True}}.items():
+        parser = TimestampParser(timezone=DEFAULT_TIMEZONE, **options)
+        results[name] = bench(parser.parse, entries)
+    for name, ns in results.items():
+        print(f"{name:>20}: {ns:>8.0f} ns/record ({results['strptime'] / ns:.1f}x)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
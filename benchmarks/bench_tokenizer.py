@@ -0,0 +1,46 @@
+import re
+import sys
+import timeit
+import argparse
+import pathlib
+
+from ftnt_log_parser.tokenizer import parse_line
+
+LOG_KEY_PATTERN = re.compile(pattern=r"(?:^| )(?P<key>[a-z_]+)=", flags=re.MULTILINE)
+
+SAMPLE_LINES = {
+    "traffic": 'date=2024-05-20 time=10:15:01 devname="FGT-01" devid="FG100FTK00000000" eventtime=1716192901123456789 tz="+0200" logid="0000000013" type="traffic" subtype="forward" level="notice" vd="root" srcip=10.0.0.10 srcport=51234 srcintf="internal" srcintfrole="lan" dstip=93.184.216.34 dstport=443 dstintf="wan1" dstintfrole="wan" srccountry="Reserved" dstcountry="United States" sessionid=123456 proto=6 action="accept" policyid=1 policytype="policy" poluuid="0b2c1a6e-1111-51ee-2222-333344445555" policyname="LAN to WAN" service="HTTPS" trandisp="snat" transip=198.51.100.1 transport=51234 appcat="unscanned" duration=12 sentbyte=2345 rcvdbyte=12345 sentpkt=10 rcvdpkt=12',
+    "utm": 'date=2024-05-20 time=10:15:02 devname="FGT-01" devid="FG100FTK00000000" eventtime=1716192902123456789 tz="+0200" logid="0316013056" type="utm" subtype="webfilter" eventtype="ftgd_blk" level="warning" vd="root" policyid=1 sessionid=123457 srcip=10.0.0.11 srcport=51235 srcintf="internal" dstip=203.0.113.5 dstport=80 dstintf="wan1" proto=6 service="HTTP" hostname="example.test" profile="default" action="blocked" reqtype="direct" url="/index.php?a=b&c=d x=y" sentbyte=512 rcvdbyte=0 direction="outgoing" msg="URL belongs to a category with warnings enabled" method="domain" cat=26 catdesc="Malicious Websites"',
+    "event": 'date=2024-05-20 time=10:15:03 devname="FGT-01" devid="FG100FTK00000000" eventtime=1716192903123456789 tz="+0200" logid="0100032001" type="event" subtype="system" level="information" vd="root" logdesc="Admin login successful" sn="1716192903" user="admin" ui="https(10.0.0.20)" method="https" srcip=10.0.0.20 dstip=10.0.0.1 action="login" status="success" reason="none" profile="super_admin" msg="Administrator admin logged in successfully from https(10.0.0.20) with \\"password\\" "',
+}
+
+
+def re_parse_line(line: str) -> dict:
+    kv_list = LOG_KEY_PATTERN.split(string=line)[1:]
+    return {k: v.strip('"') for k, v in zip(kv_list[::2], kv_list[1::2])}
+
+
+def bench(func, lines, repeat: int = 5) -> float:
+    best = min(timeit.repeat(lambda: [func(line) for line in lines], number=1, repeat=repeat))
+    return len(lines) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare regex split and tokenizer parsing speed")
+    parser.add_argument('-i', '--input-file', dest='input_file', type=pathlib.Path, help="Plaintext log file to use instead of built-in samples")
+    parser.add_argument('--count', type=int, default=50000)
+    args = parser.parse_args()
+
+    samples = dict(SAMPLE_LINES)
+    if args.input_file is not None:
+        samples = {args.input_file.name: args.input_file.read_text(encoding='utf-8').splitlines()}
+    for name, lines in samples.items():
+        if isinstance(lines, str):
+            lines = [lines] * args.count
+        regex = bench(re_parse_line, lines)
+        tokenizer = bench(parse_line, lines)
+        print(f"{name:>10}: regex split {regex:>10.0f} lines/s, tokenizer {tokenizer:>10.0f} lines/s ({tokenizer / regex:.2f}x)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
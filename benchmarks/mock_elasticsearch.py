@@ -0,0 +1,66 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockElasticsearchHandler(BaseHTTPRequestHandler):
+    # Minimal stand-in for Elasticsearch, accepts single document and _bulk requests
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data: dict, status: int = 200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        self.send_json({"version": {"number": "8.8.0"}, "tagline": "You Know, for Search"})
+
+    # Ids of documents sent with 'create', so repeated creates are rejected like in Elasticsearch
+    created_ids = set()
+    lock = threading.Lock()
+
+    def create(self, doc_id: str) -> bool:
+        with self.lock:
+            if doc_id in self.created_ids:
+                return False
+            self.created_ids.add(doc_id)
+            return True
+
+    def do_POST(self):
+        body = self.read_body()
+        path = self.path.split('?')[0]
+        if path.endswith("/_bulk"):
+            lines = body.splitlines()
+            items = []
+            for action_line in lines[::2]:
+                op_type, meta = next(iter(json.loads(action_line).items()))
+                if op_type == "create" and not self.create(meta.get("_id")):
+                    items.append({op_type: {"status": 409, "error": {"type": "version_conflict_engine_exception"}}})
+                else:
+                    items.append({op_type: {"status": 201, "result": "created"}})
+            errors = any(next(iter(x.values()))["status"] >= 300 for x in items)
+            self.send_json({"took": 1, "errors": errors, "items": items})
+        elif "/_create/" in path and not self.create(path.rsplit("/", 1)[1]):
+            self.send_json({"error": {"type": "version_conflict_engine_exception"}, "status": 409}, status=409)
+        else:
+            self.send_json({"_index": "mock", "_id": "1", "result": "created"}, status=201)
+
+    do_PUT = do_POST
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), MockElasticsearchHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -1,58 +1,41 @@
-import json
 import pathlib
 import pandas as pd
 
 from ftnt_log_parser.common import LogLoader
+from ftnt_log_parser.analytics.df_cache import DataFrameCache
 
 class LogAnalytics:
 
     def __init__(self) -> None:
         self.BASE_CACHE_DIR = None
         self.DF_CACHE_DIR = None
-        self.DF_CACHE_MAP_PATH = None
-        self.DF_CACHE_MAP = None
+        self.DF_CACHE_MAX_SIZE = 10 * 2**30
+        self.DF_CACHE = None
 
     def _preparation(self):
         self.BASE_CACHE_DIR.mkdir(exist_ok=True)
         self.DF_CACHE_DIR = self.BASE_CACHE_DIR.joinpath("dataframes")
-        self.DF_CACHE_DIR.mkdir(exist_ok=True)
-        self.DF_CACHE_MAP_PATH = self.DF_CACHE_DIR.joinpath("dataframes.json")
-        self.DF_CACHE_MAP_PATH.touch()
-
-    def _load_df_cache_map(self):
-        with self.DF_CACHE_MAP_PATH.open() as fp:
-            self.DF_CACHE_MAP = json.load(fp=fp)
-    
-    def _store_df_cache_map(self):
-        with self.DF_CACHE_MAP_PATH.open(mode="w") as fp:
-            json.dump(obj=self.DF_CACHE_MAP, fp=fp, indent=2)
+        self.DF_CACHE = DataFrameCache(cache_dir=self.DF_CACHE_DIR, max_size=self.DF_CACHE_MAX_SIZE)
 
     def path_to_df(self, path: str, keep_columns: list[str] = None):
-        self._load_df_cache_map()
         path = pathlib.Path(path)
-
         file_name = path.name
-        file_base_name = file_name.split('.')[0]
-
-        df = None
-        pickle_path = None
 
-        if self.DF_CACHE_MAP.get(file_name, None) is not None:
-            pickle_path = self.DF_CACHE_MAP.get(file_name)
-            print(f"Loading {file_name} from cache")
-            df = pd.read_pickle(pickle_path)
+        df = self.DF_CACHE.get(path=path, columns=keep_columns)
+        if df is not None:
+            print(f"Loaded {file_name} from cache")
         else:
-            pickle_path = self.DF_CACHE_DIR.joinpath(f"{file_base_name}.pkl")
-            df = LogLoader.file_to_df(file=path)
-            
+            # Only keep_columns are parsed, together with columns of an existing projected entry,
+            # so that alternating projections don't replace each other in cache
+            fields = keep_columns
+            cached_columns = self.DF_CACHE.columns(path=path)
+            if fields is not None and cached_columns is not None:
+                fields = list(dict.fromkeys([*cached_columns, *fields]))
+            df = LogLoader.file_to_df(file=path, fields=fields)
+            print(f"Storing {file_name} to cache")
+            self.DF_CACHE.put(path=path, df=df, columns=fields)
             if keep_columns is not None:
                 df.drop([x for x in df.columns if x not in keep_columns], axis=1, inplace=True)
-            
-            print(f"Storing {file_name} to cache")
-            df.to_pickle(pickle_path)
-            self.DF_CACHE_MAP[file_name] = str(pickle_path)
-        
-        self._store_df_cache_map()
 
         return df
     
@@ -108,13 +91,13 @@ class LogAnalytics:
 
     def summarize_ip_sessions(self, df):
         df_copy = df.copy()
-        df_copy = df_copy.groupby(['srccountry', 'srcip']).size().reset_index(name='sessions')
+        df_copy = df_copy.groupby(['srccountry', 'srcip'], observed=True).size().reset_index(name='sessions')
         df_copy.sort_values(by='sessions', ascending=False, inplace=True)
         return df_copy
 
     def summarize_by_srccountry(self, df):
         df_copy = df.copy()
-        summary_df = df_copy.groupby('srccountry').agg(
+        summary_df = df_copy.groupby('srccountry', observed=True).agg(
             num_sessions=('srcip', 'size'),
             unique_ips=('srcip', 'nunique'),
             average_sessions_per_ip=('srcip', lambda x: x.size / x.nunique())
@@ -127,7 +110,7 @@ class LogAnalytics:
     def summarize_by_srccountry_and_subnet(self, df):
         df_copy = df.copy()
         df_copy["subnet"] = df_copy["srcip"].map(lambda x: '.'.join(str(x).split('.')[:3]) + '.0/24')
-        summary_df = df_copy.groupby(['srccountry', 'subnet']).agg(
+        summary_df = df_copy.groupby(['srccountry', 'subnet'], observed=True).agg(
             num_sessions=('srcip', 'size'),
             unique_ips=('srcip', 'nunique'),
             average_sessions_per_ip=('srcip', lambda x: x.size / x.nunique())
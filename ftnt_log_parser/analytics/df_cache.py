@@ -0,0 +1,106 @@
+import json
+import time
+import hashlib
+import pathlib
+from typing import Dict, List, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from ftnt_log_parser.common import PARSER_VERSION
+
+
+class DataFrameCache:
+    """
+    On-disk cache of parsed log DataFrames stored as uncompressed Arrow IPC (Feather) files.
+
+    Entries are keyed by source path, size, mtime and parser version, so a changed file or
+    parser never serves stale data. Reads are memory-mapped and only requested columns are
+    converted to pandas. Least recently used entries are evicted once max_size bytes is exceeded.
+    Entries of frames parsed with field projection record their columns and serve only requests
+    within them.
+    """
+
+    def __init__(self, cache_dir: pathlib.Path, max_size: int = 10 * 2**30) -> None:
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.index_path = self.cache_dir.joinpath("index.json")
+        self.index: Dict[str, dict] = self.load_index()
+
+    def load_index(self) -> Dict[str, dict]:
+        index = {}
+        if self.index_path.exists():
+            try:
+                index = json.loads(self.index_path.read_text())
+            except json.JSONDecodeError:
+                print(f"Cache index {self.index_path} is corrupted, starting with empty cache")
+        # Drop entries whose data files were removed by hand
+        return {k: v for k, v in index.items() if self.cache_dir.joinpath(v['file']).exists()}
+
+    def store_index(self):
+        tmp_path = self.index_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.index, indent=2))
+        tmp_path.replace(self.index_path)
+
+    @staticmethod
+    def make_key(path: pathlib.Path) -> str:
+        path = pathlib.Path(path).resolve()
+        stat = path.stat()
+        raw = f"{path}|{stat.st_size}|{stat.st_mtime_ns}|{PARSER_VERSION}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, path: pathlib.Path, columns: List[str] = None) -> Optional[pd.DataFrame]:
+        key = self.make_key(path=path)
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        if entry.get('columns') is not None and (columns is None or not set(columns) <= set(entry['columns'])):
+            return None
+        table = feather.read_table(str(self.cache_dir.joinpath(entry['file'])), memory_map=True)
+        if columns is not None:
+            table = table.select([x for x in table.column_names if x in columns])
+        entry['last_access'] = time.time()
+        self.store_index()
+        return table.to_pandas()
+
+    def columns(self, path: pathlib.Path) -> Optional[List[str]]:
+        # Columns of current projected entry for path, None for whole frame or no entry
+        entry = self.index.get(self.make_key(path=path))
+        return entry.get('columns') if entry is not None else None
+
+    def put(self, path: pathlib.Path, df: pd.DataFrame, columns: List[str] = None):
+        path = pathlib.Path(path).resolve()
+        key = self.make_key(path=path)
+        file_name = f"{key}.arrow"
+        tmp_path = self.cache_dir.joinpath(f"{file_name}.tmp")
+        table = pa.Table.from_pandas(df=df, preserve_index=False)
+        # Uncompressed, so that reads can be served directly from the memory map
+        feather.write_feather(table, str(tmp_path), compression='uncompressed')
+        tmp_path.replace(self.cache_dir.joinpath(file_name))
+        # Older entries for the same path are stale now, an entry with the same key was just overwritten
+        for old_key in [k for k, v in self.index.items() if v['path'] == str(path) and k != key]:
+            self.remove(key=old_key)
+        self.index[key] = {
+            'path': str(path),
+            'file': file_name,
+            'bytes': self.cache_dir.joinpath(file_name).stat().st_size,
+            'parser_version': PARSER_VERSION,
+            'columns': columns,
+            'last_access': time.time()
+        }
+        self.evict()
+        self.store_index()
+
+    def remove(self, key: str):
+        entry = self.index.pop(key)
+        self.cache_dir.joinpath(entry['file']).unlink(missing_ok=True)
+
+    def evict(self):
+        total = sum(x['bytes'] for x in self.index.values())
+        for key, entry in sorted(self.index.items(), key=lambda x: x[1]['last_access']):
+            if total <= self.max_size:
+                break
+            print(f"Evicting {entry['path']} from cache")
+            total -= entry['bytes']
+            self.remove(key=key)
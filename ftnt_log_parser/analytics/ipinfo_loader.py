@@ -1,5 +1,7 @@
 import pathlib
 import ipaddress
+from typing import Dict, Optional, Tuple
+import numpy as np
 import pandas as pd
 
 BASE_DB_DIR = pathlib.Path.home().joinpath("Develop/ipinfo/db")
@@ -11,7 +13,7 @@ def convert_to_ipaddress(ip):
         return ipaddress.ip_address(ip)
     except ValueError:
         return None  # Return None for invalid IPs
-    
+
 def get_ip_version(ip):
     if ip is not None:
         if isinstance(ip, ipaddress.IPv4Address):
@@ -20,31 +22,161 @@ def get_ip_version(ip):
             return 'IPv6'
     return None
 
-def load_db():
-    df = pd.read_csv(DB_PATH, compression='gzip')
-    df['start_ip'] = df['start_ip'].apply(convert_to_ipaddress)
-    df['end_ip'] = df['end_ip'].apply(convert_to_ipaddress)
-    df['ip_version'] = df.apply(lambda row: get_ip_version(row['start_ip']), axis=1)
-    df_ipv4 = df[df['ip_version'] == 'IPv4']
-    df_ipv6 = df[df['ip_version'] == 'IPv6']
-    return df_ipv4, df_ipv6
+def ipv4_to_int(ips: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    # Vectorized dotted quad to int conversion, returns (values, valid mask)
+    parts = ips.astype(str).str.split('.', expand=True)
+    if parts.shape[1] != 4:
+        parts = parts.reindex(columns=range(4))
+    octets = parts.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    valid = ~np.isnan(octets).any(axis=1) & (octets >= 0).all(axis=1) & (octets <= 255).all(axis=1)
+    valid &= (ips.astype(str).str.count(r'\.') == 3).to_numpy()
+    octets = np.where(valid[:, None], octets, 0).astype(np.int64)
+    values = (octets[:, 0] << 24) | (octets[:, 1] << 16) | (octets[:, 2] << 8) | octets[:, 3]
+    return values, valid
+
+def ipv6_to_bytes(ip: str) -> bytes:
+    # 16 byte big endian form, sorts the same way as the address in numpy 'S16' arrays
+    try:
+        return ipaddress.IPv6Address(ip).packed
+    except ValueError:
+        return b''
+
+
+class IpInfoIndex:
+    """
+    Range lookup over ipinfo country_asn database.
+
+    IPv4 ranges are stored as sorted uint32 start/end arrays, IPv6 ranges as sorted 16 byte
+    strings, lookups are binary searches returning position in records DataFrame.
+    """
+
+    def __init__(self, records: pd.DataFrame, ranges: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]) -> None:
+        self.records = records
+        # version -> (starts, ends, record positions), sorted by starts
+        self.ranges = ranges
+
+    @classmethod
+    def from_csv(cls, path: pathlib.Path = DB_PATH) -> 'IpInfoIndex':
+        df = pd.read_csv(path, compression='gzip', dtype=str, keep_default_na=False)
+        is_v6 = df['start_ip'].str.contains(':', regex=False).to_numpy()
+        records = df.drop(['start_ip', 'end_ip'], axis=1).astype('category').reset_index(drop=True)
+        positions = np.arange(len(df))
+        ranges = {}
+
+        starts, _ = ipv4_to_int(df['start_ip'][~is_v6])
+        ends, _ = ipv4_to_int(df['end_ip'][~is_v6])
+        ranges['v4'] = cls.sort_ranges(starts.astype(np.uint32), ends.astype(np.uint32), positions[~is_v6])
+
+        starts = np.array([ipv6_to_bytes(x) for x in df['start_ip'][is_v6]], dtype='S16')
+        ends = np.array([ipv6_to_bytes(x) for x in df['end_ip'][is_v6]], dtype='S16')
+        ranges['v6'] = cls.sort_ranges(starts, ends, positions[is_v6])
+        return cls(records=records, ranges=ranges)
+
+    @staticmethod
+    def sort_ranges(starts: np.ndarray, ends: np.ndarray, positions: np.ndarray):
+        order = np.argsort(starts, kind='stable')
+        return starts[order], ends[order], positions[order]
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> 'IpInfoIndex':
+        data = pd.read_pickle(path)
+        return cls(records=data['records'], ranges=data['ranges'])
+
+    def save(self, path: pathlib.Path):
+        pd.to_pickle({'records': self.records, 'ranges': self.ranges}, path)
+
+    @staticmethod
+    def search(ranges: Tuple[np.ndarray, np.ndarray, np.ndarray], keys: np.ndarray) -> np.ndarray:
+        starts, ends, positions = ranges
+        if not len(starts):
+            return np.full(len(keys), -1, dtype=np.int64)
+        idx = np.searchsorted(starts, keys, side='right') - 1
+        clipped = np.clip(idx, 0, None)
+        found = (idx >= 0) & (keys <= ends[clipped])
+        return np.where(found, positions[clipped], -1)
+
+    def lookup_positions(self, ips: pd.Series) -> np.ndarray:
+        # Each distinct IP is searched only once, logs repeat the same addresses a lot
+        codes, uniques = pd.factorize(ips)
+        uniques = pd.Series(uniques, dtype=str)
+        result = np.full(len(uniques), -1, dtype=np.int64)
+        is_v6 = uniques.str.contains(':', regex=False).to_numpy()
+
+        values, valid = ipv4_to_int(uniques[~is_v6])
+        v4_result = self.search(self.ranges['v4'], values.astype(np.uint32))
+        result[~is_v6] = np.where(valid, v4_result, -1)
+
+        if is_v6.any():
+            packed = [ipv6_to_bytes(x) for x in uniques[is_v6]]
+            # '::' is stored as b'' in 'S16' too (trailing NULs are stripped), validity is checked before
+            valid = np.array([len(x) == 16 for x in packed], dtype=bool)
+            keys = np.array(packed, dtype='S16')
+            v6_result = self.search(self.ranges['v6'], keys)
+            result[is_v6] = np.where(valid, v6_result, -1)
+
+        return np.where(codes >= 0, result[codes], -1)
+
+    def lookup_position(self, ip: str) -> int:
+        # Scalar lookup without pandas overhead, used by streaming enrichment
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return -1
+        if address.version == 4:
+            starts, ends, positions = self.ranges['v4']
+            key = int(address)
+        else:
+            starts, ends, positions = self.ranges['v6']
+            # Same form as stored starts/ends, 'S16' strips trailing NUL bytes
+            key = np.array([address.packed], dtype='S16')[0]
+        idx = int(np.searchsorted(starts, key, side='right')) - 1
+        if idx < 0 or key > ends[idx]:
+            return -1
+        return int(positions[idx])
+
+    def lookup(self, ip: str) -> Optional[pd.Series]:
+        position = self.lookup_positions(pd.Series([str(ip)]))[0]
+        if position < 0:
+            return None
+        return self.records.iloc[position]
+
+    def lookup_df(self, ips: pd.Series) -> pd.DataFrame:
+        positions = self.lookup_positions(ips)
+        found = positions >= 0
+        result = self.records.iloc[np.where(found, positions, 0)].reset_index(drop=True)
+        result.loc[~found, :] = None
+        result.index = ips.index
+        return result
+
+    def enrich_df(self, df: pd.DataFrame, column: str = 'srcip', prefix: str = None) -> pd.DataFrame:
+        if prefix is None:
+            prefix = column.removesuffix('ip') + '_'
+        result = self.lookup_df(df[column]).add_prefix(prefix)
+        return df.join(result)
+
+
+def load_db(path: pathlib.Path = DB_PATH, use_cache: bool = True) -> IpInfoIndex:
+    # Compiled index is stored next to the CSV and rebuilt when the CSV changes
+    cache_path = path.with_name(path.name.split('.')[0] + '.idx.pkl')
+    if use_cache and cache_path.exists() and cache_path.stat().st_mtime >= path.stat().st_mtime:
+        return IpInfoIndex.load(path=cache_path)
+    index = IpInfoIndex.from_csv(path=path)
+    if use_cache:
+        index.save(path=cache_path)
+    return index
 
 
-def find_row_for_ip(df, ip):
-    ip = ipaddress.ip_address(ip)
-    for index, row in df.iterrows():
-        if row['start_ip'] <= ip <= row['end_ip']:
-            return row
-    return None  # Return None if no row contains the IP address
+def find_row_for_ip(index: IpInfoIndex, ip):
+    return index.lookup(ip)  # Return None if no row contains the IP address
 
 
 
 def main():
-    df_ipv4, df_ipv6 = load_db()
+    index = load_db()
     ip = ipaddress.IPv4Address("62.109.150.0")
-    row = find_row_for_ip(df_ipv4, ip)
+    row = find_row_for_ip(index, ip)
     print(row)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
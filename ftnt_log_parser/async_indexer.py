@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import timeit
+from typing import Any, Callable, Dict, Iterable, List, Literal, Tuple
+from elasticsearch import AsyncElasticsearch, ConflictError
+
+from ftnt_log_parser.elasticsearch_indexer import ElasticIndexer
+
+
+class AsyncElasticIndexer(ElasticIndexer):
+    """
+    ElasticIndexer variant sending requests from a single asyncio event loop instead of threads.
+
+    Requests are coroutines on one AsyncElasticsearch client, at most max_workers of them in
+    flight, using a connection pool of the same size. Documents are still produced by the
+    synchronous parse pipeline, which runs in a helper thread one batch at a time.
+    The client is created per run from client_options, since it is bound to the event loop.
+    """
+
+    def __init__(self, client_options: Dict[str, Any], index_name: str, pipeline: str = None, id_key: str = None, label: str = None, stop_event: threading.Event = None, id_mode: Literal['key', 'fields', 'content'] = 'key', id_fields: List[str] = None, op_type: Literal['index', 'create'] = 'index', id_exclude: Iterable[str] = None) -> None:
+        super().__init__(client=None, index_name=index_name, pipeline=pipeline, id_key=id_key, label=label, stop_event=stop_event, id_mode=id_mode, id_fields=id_fields, op_type=op_type, id_exclude=id_exclude)
+        self.client_options = client_options
+
+    async def index_record(self, doc: dict) -> int:
+        event_id = self.get_event_id(doc=doc)
+        if self.op_type == 'create' and event_id is not None:
+            try:
+                await self.client.create(index=self.index_name, document=doc, id=event_id, pipeline=self.pipeline)
+            except ConflictError:
+                self.add_duplicates(count=1)
+        else:
+            await self.client.index(index=self.index_name, document=doc, id=event_id, pipeline=self.pipeline)
+        return 0
+
+    async def index_batch(self, batch: List[bytes]) -> int:
+        res = await self.client.bulk(operations=b"".join(batch), index=self.index_name, pipeline=self.pipeline)
+        return self.count_failed(res=res, batch=batch)
+
+    async def arun(self, tasks: Iterable[Tuple[Callable, Any, int]], max_workers: int):
+        loop = asyncio.get_running_loop()
+        self.client = AsyncElasticsearch(connections_per_node=max_workers, **self.client_options)
+        slots = asyncio.Semaphore(max_workers)
+        pending = {}
+        done_marker = object()
+        iterator = iter(tasks)
+
+        def on_done(task: asyncio.Task):
+            slots.release()
+            count, sequence = pending.pop(task)
+            self.handle_done(task, count, sequence)
+
+        sequence = 0
+        try:
+            while True:
+                if self.stop_event is not None and self.stop_event.is_set():
+                    raise KeyboardInterrupt
+                # Parsing runs outside of the loop, so requests keep progressing meanwhile
+                task = await loop.run_in_executor(None, next, iterator, done_marker)
+                if task is done_marker:
+                    break
+                if task is None:
+                    continue
+                func, arg, count = task
+                await slots.acquire()
+                request = asyncio.ensure_future(func(arg))
+                pending[request] = (count, sequence)
+                request.add_done_callback(on_done)
+                sequence += 1
+            if pending:
+                await asyncio.wait(list(pending))
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            for request in pending:
+                request.cancel()
+            if pending:
+                await asyncio.wait(list(pending))
+            raise KeyboardInterrupt
+        finally:
+            await self.client.close()
+            self.client = None
+
+    def run_bounded(self, tasks: Iterable[Tuple[Callable, Any, int]], max_workers: int, max_pending: int = None) -> Tuple[int, int]:
+        # max_pending is not used, requests are only created when a connection slot is free
+        self.start_timer = timeit.default_timer()
+        completed = False
+        try:
+            asyncio.run(self.arun(tasks=tasks, max_workers=max_workers))
+            completed = True
+        except KeyboardInterrupt:
+            print("KeyboardInterrup: Exiting")
+        return self.finish(completed=completed)
@@ -0,0 +1,66 @@
+import json
+import time
+import pathlib
+
+
+class Checkpoint:
+    """
+    Sidecar file recording how many lines of an input file were acknowledged by Elasticsearch.
+
+    Stored next to the input file as '<name>.flpckpt', tied to its size, mtime and target index,
+    so a replaced file or different index starts from the beginning.
+    """
+
+    SUFFIX = '.flpckpt'
+
+    def __init__(self, file: pathlib.Path, index_name: str = None, interval: float = 1.0) -> None:
+        self.file = file
+        self.path = file.with_name(file.name + self.SUFFIX)
+        self.index_name = index_name
+        # Minimal number of seconds between writes
+        self.interval = interval
+        self.start_line = 0
+        self.line = 0
+        self.completed = False
+        # Set when only part of the remaining lines is read (--head), the file is then not completed
+        self.partial = False
+        self.last_save = 0.0
+
+    def load(self) -> int:
+        # Returns line to resume from
+        if not self.path.exists():
+            return 0
+        try:
+            data = json.loads(self.path.read_text())
+        except json.JSONDecodeError:
+            print(f"Checkpoint {self.path} is corrupted, starting from beginning")
+            return 0
+        stat = self.file.stat()
+        if data.get('size') != stat.st_size or data.get('mtime_ns') != stat.st_mtime_ns or data.get('index') != self.index_name:
+            print(f"Checkpoint {self.path} does not match the file or index, starting from beginning")
+            return 0
+        self.start_line = self.line = data['line']
+        self.completed = data.get('completed', False)
+        return self.line
+
+    def save(self, completed: bool = False):
+        stat = self.file.stat()
+        data = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'index': self.index_name, 'line': self.line, 'completed': completed}
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        try:
+            tmp_path.write_text(json.dumps(data))
+            tmp_path.replace(self.path)
+        except OSError as e:
+            print(f"Failed to store checkpoint {self.path}: {repr(e)}")
+        self.last_save = time.monotonic()
+
+    def acknowledge(self, count: int):
+        # count is the number of documents acknowledged in order since start_line
+        self.line = self.start_line + count
+        if time.monotonic() - self.last_save >= self.interval:
+            self.save()
+
+    def complete(self):
+        self.completed = True
+        self.save(completed=True)
+
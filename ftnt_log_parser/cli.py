@@ -1,12 +1,27 @@
 import sys
+import json
 import argparse
 import pathlib
 import itertools
+import glob
+import threading
+from typing import Callable, Iterable, List
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from elasticsearch import Elasticsearch
-from ftnt_log_parser.common import LOG_KEY_PATTERN, LogLoader
+from ftnt_log_parser.common import SCHEMAS, LogLoader
 from ftnt_log_parser.elasticsearch_indexer import ElasticIndexer
-from ftnt_log_parser.config import CONFIG, FLPConfig, get_config
+from ftnt_log_parser.async_indexer import AsyncElasticIndexer
+from ftnt_log_parser.config import FLPConfig, get_config
+from ftnt_log_parser.utils import ReadProgress
+from ftnt_log_parser.scheduler import FileScheduler, expand_input_path
+from ftnt_log_parser.enrichment import GeoIpEnricher
+from ftnt_log_parser.checkpoint import Checkpoint
+from ftnt_log_parser.follow import FollowState, LogFollower
+from ftnt_log_parser.syslog import SyslogReceiver, replay
+from ftnt_log_parser.filters import LogFilter
+from ftnt_log_parser.schemas import SchemaRegistry
+from ftnt_log_parser.serializers import OUTPUT_FORMATS, serialize, serialize_lines, write_output
 
 CWD = pathlib.Path.cwd()
 
@@ -24,6 +39,25 @@ def to_path(path_str: str):
             raise argparse.ArgumentTypeError("Path does not exist")
     return path
 
+def to_paths(path_str: str):
+    # File, directory or glob pattern
+    paths = expand_input_path(path_str=path_str)
+    if not len(paths):
+        if glob.has_magic(path_str):
+            raise argparse.ArgumentTypeError(f"Pattern {path_str} does not match any log files")
+        paths = expand_input_path(path_str=str(to_path(path_str)))
+        if not len(paths):
+            raise argparse.ArgumentTypeError(f"Path {path_str} does not contain any log files")
+    return paths
+
+def to_address(address_str: str):
+    # host:port, [ipv6]:port or just port
+    host, _, port = address_str.rpartition(':')
+    try:
+        return host.strip('[]') or '0.0.0.0', int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Address {address_str} is not in host:port format")
+
 class ParseKwargs(argparse.Action):
     def __call__(self, parser, namespace, values, option_string=None):
         setattr(namespace, self.dest, dict())
@@ -39,7 +73,7 @@ class Cli(object):
             description="",
             usage="flp <command> [<args>]"
         )
-        parser.add_argument('command', help='Subcommand to run. Options: {read,index}')
+        parser.add_argument('command', help='Subcommand to run. Options: {read,index,follow,listen,replay,template}')
         args = parser.parse_args(sys.argv[1:2])
         if not hasattr(self, args.command):
             print('Unrecognized command')
@@ -65,13 +99,122 @@ class Cli(object):
             dest='input_files',
             action='append',
             required=True,
-            type=to_path
+            type=to_paths,
+            help="Log file, directory or glob pattern, can be repeated"
 
         )
-        
+        common_parser.add_argument(
+            '-w',
+            '--workers',
+            dest='workers',
+            type=int,
+            default=None,
+            help="Number of worker processes used for parsing"
+        )
+        common_parser.add_argument(
+            '--geoip-db',
+            dest='geoip_db',
+            type=to_path,
+            default=None,
+            help="ipinfo country_asn CSV or compiled index used to add country/ASN fields for srcip/dstip"
+        )
+        common_parser.add_argument(
+            '--unordered',
+            dest='ordered',
+            action='store_false',
+            default=True,
+            help="Allow parsed records to be output out of order when using workers"
+        )
+        common_parser.add_argument(
+            '--decompress-workers',
+            dest='decompress_workers',
+            type=int,
+            default=None,
+            help="Decompress multi-member gzip files using given number of worker processes"
+        )
+        common_parser.add_argument(
+            '--start-line',
+            dest='start_line',
+            type=int,
+            default=0,
+            help="Start reading each file at given line, uses sidecar .flpidx index for plain and gzip files"
+        )
+        self.add_fields_argument(parser=common_parser)
+        self.add_schema_argument(parser=common_parser)
 
         return deepcopy(common_parser)
 
+    @staticmethod
+    def add_id_arguments(parser: argparse.ArgumentParser):
+        parser.add_argument('--id-key', dest='id_key', required=False, help="Key to use for Elastic _id field", default=None)
+        parser.add_argument('--id-mode', dest='id_mode', choices=['key', 'fields', 'content'], default='key', help="Elastic _id from --id-key value, digest of --id-fields values or digest of whole record")
+        parser.add_argument('--id-fields', dest='id_fields', type=lambda x: x.split(','), default=None, help="Comma separated fields hashed into _id with --id-mode fields, default devid,eventtime,sessionid,logid, records missing any of them get digest of whole record")
+        parser.add_argument('--op-type', dest='op_type', choices=['index', 'create'], default='index', help="With 'create', documents whose _id already exists are skipped instead of overwritten")
+
+    @staticmethod
+    def check_id_options(parser: argparse.ArgumentParser, args: argparse.Namespace):
+        # Ids are computed from indexed documents, projection would drop the keys they are built from
+        if args.fields is None:
+            return
+        if args.id_mode != 'key':
+            parser.error(f"--fields cannot be combined with --id-mode {args.id_mode}, ids would be built from projected fields only")
+        if args.id_key is not None and args.id_key not in args.fields:
+            parser.error(f"--id-key {args.id_key} has to be one of --fields")
+
+    def get_id_options(self, args: argparse.Namespace, geoip: GeoIpEnricher = None) -> dict:
+        # Keys added by enrichment are left out of content ids, so ids don't change with the GeoIP DB or config
+        id_exclude = {path.split('.')[0] for path in (self.CONFIG.enrich or {})}
+        if geoip is not None:
+            id_exclude.update(geoip.keys)
+        return dict(
+            id_key=args.id_key if args.id_key is not None else "msg_id",
+            id_mode=args.id_mode,
+            id_fields=args.id_fields,
+            id_exclude=id_exclude,
+            op_type=args.op_type
+        )
+
+    @staticmethod
+    def add_fields_argument(parser: argparse.ArgumentParser):
+        parser.add_argument('--fields', dest='fields', type=lambda x: x.split(','), default=None, help="Comma separated keys to keep in parsed records, other values are not extracted, eg. srcip,action,dstport,@timestamp")
+
+    @staticmethod
+    def add_schema_argument(parser: argparse.ArgumentParser):
+        parser.add_argument('--schema', dest='schema', action='store_true', default=False, help="Convert values by type/subtype schema: numbers to int, IPv6 to compressed form, see flp template")
+
+    @staticmethod
+    def get_schema(args: argparse.Namespace) -> SchemaRegistry:
+        return SCHEMAS if args.schema else None
+
+    @staticmethod
+    def add_filter_argument(parser: argparse.ArgumentParser):
+        parser.add_argument('--filter', dest='filter', default=None, help="Only records matching expression, eg. 'type=traffic action=deny,timeout dstport>=1024 @timestamp>=2024-05-20T10:00', terms are ANDed, groups separated by 'or'")
+
+    def get_log_filter(self, parser: argparse.ArgumentParser, args: argparse.Namespace, prefer_epoch: bool = False) -> LogFilter:
+        if args.filter is None:
+            return None
+        try:
+            return LogFilter.parse(expression=args.filter, timezone=self.CONFIG.DEFAULT_TIMEZONE, prefer_epoch=prefer_epoch)
+        except ValueError as e:
+            parser.error(str(e))
+
+    def get_geoip_enricher(self, args: argparse.Namespace):
+        db_path = args.geoip_db
+        options = {}
+        if self.CONFIG.geoip is not None:
+            options = dict(fields=self.CONFIG.geoip.fields, cache_size=self.CONFIG.geoip.cache_size)
+            if db_path is None:
+                db_path = self.CONFIG.geoip.db_path
+        if db_path is None:
+            return None
+        return GeoIpEnricher.from_path(path=db_path, **options)
+
+    @staticmethod
+    def use_ranges(input_file: pathlib.Path, args: argparse.Namespace, start_line: int = None) -> bool:
+        # Workers can read whole plaintext files themselves, unless only part of the file is wanted
+        start_line = args.start_line if start_line is None else start_line
+        return LogLoader.determine_filetype(file=input_file) == 'plain' and not start_line and args.head is None
+
     def read(self):
         parser = self._common_parser
         parser.description = "Read the logfile and output to stdout"
@@ -92,65 +235,339 @@ class Cli(object):
         parser.add_argument(
             '--format',
             dest='format',
-            choices=['json', 'json-pretty'],
-            help="Output format"
+            choices=OUTPUT_FORMATS,
+            help="Output format of parsed records"
+        )
+        parser.add_argument(
+            '--bulk-index',
+            dest='bulk_index',
+            default=None,
+            help="Target index set in actions of --format bulk output"
         )
+        self.add_filter_argument(parser=parser)
         args = parser.parse_args(sys.argv[2:])
         self.CONFIG = get_config(sys.argv)
-        input_files = args.input_files
+        log_filter = self.get_log_filter(parser=parser, args=args)
+        if log_filter is not None or args.fields is not None or args.schema:
+            args.parse = True
+        # Records are timestamped only when @timestamp is projected
+        timestamp = args.fields is not None and '@timestamp' in args.fields
+        schema = self.get_schema(args=args)
+        input_files = list(itertools.chain.from_iterable(args.input_files))
         for input_file in input_files:
-            lines = LogLoader.read_lines(file=input_file)
-            if args.head is not None:
+            lines = LogLoader.read_lines(file=input_file, start_line=args.start_line, decompress_workers=args.decompress_workers)
+            if args.head is not None and log_filter is None:
                 lines = LogLoader.head(lines, count=args.head)
             if args.parse is True:
-                lines = LogLoader.re_parse_lines(lines=lines)
+                if args.workers is not None and self.use_ranges(input_file=input_file, args=args):
+                    lines = LogLoader.parallel_parse_file(file=input_file, workers=args.workers, ordered=args.ordered, timestamp=timestamp, log_filter=log_filter, fields=args.fields, schema=schema)
+                elif args.workers is not None:
+                    lines = LogLoader.parallel_parse_lines(lines=lines, workers=args.workers, ordered=args.ordered, timestamp=timestamp, log_filter=log_filter, fields=args.fields, schema=schema)
+                else:
+                    lines = LogLoader.parse_entries(lines=lines, timestamp=timestamp, log_filter=log_filter, fields=args.fields, schema=schema)
+                if args.head is not None and log_filter is not None:
+                    # Head counts matching records
+                    lines = LogLoader.head(lines, count=args.head)
+                geoip = self.get_geoip_enricher(args=args)
+                if geoip is not None:
+                    lines = geoip.enrich(entries=lines)
                 if args.format is not None:
-                    lines = LogLoader.format(entries=lines, format=args.format)
-            for line in lines:
-                print(line)
+                    write_output(chunks=serialize(entries=lines, format=args.format, index_name=args.bulk_index, fields=args.fields))
+                    continue
+                lines = (str(x) for x in lines)
+            write_output(chunks=serialize_lines(lines=lines))
     
     def index(self):
         parser = self._common_parser
         parser.add_argument('--index', dest='elasticsearch_index', required=True)
         parser.add_argument('--pipeline', dest='elasticsearch_pipeline', required=False, help="Name of the Ingest Pipeline")
-        parser.add_argument('--id-key', dest='id_key', required=False, help="Key to use for Elastic _id field", default=None)
+        self.add_id_arguments(parser=parser)
         parser.add_argument('--head', dest='head', required=False, default=None, type=int, help="Number of HEAD lines to index")
         parser.add_argument('--enrich', dest='enrich', nargs='*', action=ParseKwargs, default=dict())
+        parser.add_argument('--bulk', dest='bulk', action='store_true', default=False, help="Index documents in batches using the _bulk API")
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=500, help="Max number of documents per bulk request")
+        parser.add_argument('--max-chunk-bytes', dest='max_chunk_bytes', type=int, default=10 * 1024 * 1024, help="Max size of bulk request body in bytes")
+        parser.add_argument('--max-workers', dest='max_workers', type=int, default=None, help="Number of concurrent indexing requests")
+        parser.add_argument('--count-records', dest='count_records', action='store_true', default=False, help="Count records before indexing for exact progress, reads each file twice")
+        parser.add_argument('--prefer-eventtime', dest='prefer_epoch', action='store_true', default=False, help="Build @timestamp from eventtime/itime fields when present")
+        parser.add_argument('--timestamp-format', dest='timestamp_format', choices=['datetime', 'epoch', 'epoch_millis'], default='datetime', help="Type of @timestamp values sent to Elasticsearch")
+        parser.add_argument('--parallel-files', dest='parallel_files', type=int, default=1, help="Number of input files indexed concurrently, sharing --max-workers")
+        parser.add_argument('--max-pending', dest='max_pending', type=int, default=None, help="Max number of documents (or bulk batches) queued for indexing, defaults to 2x max workers")
+        parser.add_argument('--async', dest='use_async', action='store_true', default=False, help="Send requests from asyncio event loop using AsyncElasticsearch instead of threads, requires aiohttp, one file at a time")
+        parser.add_argument('--checkpoint', dest='checkpoint', action='store_true', default=False, help="Store acknowledged line per file in .flpckpt sidecar and resume from it")
+        self.add_filter_argument(parser=parser)
 
         parser.description = "Read the logfile and send to Elasticsearch"
         parser.usage = "flp index [<args>]"
         args = parser.parse_args(sys.argv[2:])
+        if args.checkpoint and args.filter is not None:
+            # Checkpoint maps acknowledged documents to lines one to one
+            parser.error("--checkpoint cannot be combined with --filter")
+        self.check_id_options(parser=parser, args=args)
+        if args.use_async and args.parallel_files > 1:
+            # Each file runs its own event loop and client, --max-workers could not be shared between them
+            parser.error("--async cannot be combined with --parallel-files greater than 1")
         self.CONFIG = get_config(args=sys.argv)
-        input_files = args.input_files
+        args.log_filter = self.get_log_filter(parser=parser, args=args, prefer_epoch=args.prefer_epoch)
+        input_files = list(itertools.chain.from_iterable(args.input_files))
         print(self.CONFIG)
 
-        es_client = Elasticsearch(
+        es_client = self.get_elastic_client()
+        max_workers = args.max_workers or (4 if args.bulk else 20)
+        # Shared between files, so hot addresses stay cached across the whole run
+        geoip = self.get_geoip_enricher(args=args)
+        id_options = self.get_id_options(args=args, geoip=geoip)
+        scheduler = FileScheduler(max_files=args.parallel_files)
+        shared_executor = None
+        if args.parallel_files > 1:
+            # All files submit to one pool, so max_workers is a global budget
+            shared_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='flp-index')
+
+        def index_job(input_file: pathlib.Path):
+            if args.use_async:
+                ei = AsyncElasticIndexer(
+                    client_options=self.get_elastic_client_options(),
+                    index_name=args.elasticsearch_index,
+                    pipeline=args.elasticsearch_pipeline,
+                    **id_options,
+                    label=input_file.name if len(input_files) > 1 else None,
+                    stop_event=scheduler.stop_event
+                )
+                return self.index_file(input_file=input_file, indexer=ei, args=args, max_workers=max_workers, geoip=geoip)
+            ei = ElasticIndexer(
+                client=es_client,
+                index_name=args.elasticsearch_index,
+                pipeline=args.elasticsearch_pipeline,
+                **id_options,
+                executor=shared_executor,
+                label=input_file.name if len(input_files) > 1 else None,
+                stop_event=scheduler.stop_event
+            )
+            return self.index_file(input_file=input_file, indexer=ei, args=args, max_workers=max_workers, geoip=geoip)
+
+        scheduler.run(files=input_files, job=index_job)
+        if shared_executor is not None:
+            shared_executor.shutdown(wait=True)
+        if len(scheduler.failures):
+            exit(1)
+
+    def follow(self):
+        parser = self._common_parser
+        parser.add_argument('--index', dest='elasticsearch_index', required=True)
+        parser.add_argument('--pipeline', dest='elasticsearch_pipeline', required=False, help="Name of the Ingest Pipeline")
+        self.add_id_arguments(parser=parser)
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=500, help="Max number of documents per bulk request")
+        parser.add_argument('--max-chunk-bytes', dest='max_chunk_bytes', type=int, default=10 * 1024 * 1024, help="Max size of bulk request body in bytes")
+        parser.add_argument('--max-workers', dest='max_workers', type=int, default=4, help="Number of concurrent bulk requests per file")
+        parser.add_argument('--max-pending', dest='max_pending', type=int, default=None, help="Max number of bulk batches queued for indexing, defaults to 2x max workers")
+        parser.add_argument('--flush-interval', dest='flush_interval', type=float, default=1.0, help="Send incomplete bulk batch once its oldest document waits this many seconds")
+        parser.add_argument('--poll-interval', dest='poll_interval', type=float, default=0.2, help="Seconds to wait before checking idle file for new lines")
+        parser.add_argument('--from-end', dest='from_end', action='store_true', default=False, help="Without stored position, start at current end of file instead of beginning")
+        parser.add_argument('--prefer-eventtime', dest='prefer_epoch', action='store_true', default=False, help="Build @timestamp from eventtime/itime fields when present")
+        parser.add_argument('--timestamp-format', dest='timestamp_format', choices=['datetime', 'epoch', 'epoch_millis'], default='datetime', help="Type of @timestamp values sent to Elasticsearch")
+
+        parser.description = "Follow growing logfiles and send new lines to Elasticsearch, position is kept in .flpfollow file"
+        parser.usage = "flp follow [<args>]"
+        args = parser.parse_args(sys.argv[2:])
+        self.check_id_options(parser=parser, args=args)
+        self.CONFIG = get_config(args=sys.argv)
+        input_files = list(itertools.chain.from_iterable(args.input_files))
+
+        es_client = self.get_elastic_client()
+        geoip = self.get_geoip_enricher(args=args)
+        id_options = self.get_id_options(args=args, geoip=geoip)
+        timestamp_options = dict(prefer_epoch=args.prefer_epoch, output=args.timestamp_format)
+        # Every file is followed until interrupted, so all of them run at once
+        scheduler = FileScheduler(max_files=len(input_files))
+
+        def follow_job(input_file: pathlib.Path):
+            state = FollowState(file=input_file)
+            follower = LogFollower(file=input_file, state=state, encoding=self.CONFIG.ENCODING, errors=self.CONFIG.ENCODING_ERRORS, poll_interval=args.poll_interval, from_end=args.from_end, stop_event=scheduler.stop_event)
+            ei = ElasticIndexer(
+                client=es_client,
+                index_name=args.elasticsearch_index,
+                pipeline=args.elasticsearch_pipeline,
+                **id_options,
+                label=input_file.name if len(input_files) > 1 else None,
+                stop_event=scheduler.stop_event
+            )
+            documents = self.batch_documents(batches=follower.batches(), timestamp_options=timestamp_options, geoip=geoip, fields=args.fields, schema=self.get_schema(args=args), on_invalid=state.skip)
+            return ei.bulk_index_data(data=documents, max_workers=args.max_workers, chunk_size=args.chunk_size, max_chunk_bytes=args.max_chunk_bytes, max_pending=args.max_pending, checkpoint=state, flush_interval=args.flush_interval)
+
+        scheduler.run(files=input_files, job=follow_job)
+        if len(scheduler.failures):
+            exit(1)
+
+    def batch_documents(self, batches: Iterable[List[str]], timestamp_options: dict, geoip: GeoIpEnricher = None, fields: List[str] = None, schema: SchemaRegistry = None, on_invalid: Callable[[int], None] = None):
+        # Endless sources yield empty batches while idle, passed on as None so bulk batches can be flushed on time.
+        # Records without date/time are dropped, their number per batch is passed to on_invalid
+        for lines in batches:
+            if not lines:
+                yield None
+                continue
+            invalid = []
+            entries = LogLoader.parse_entries(lines=lines, enrich_dict=self.CONFIG.enrich, timestamp_options=timestamp_options, fields=fields, schema=schema, invalid=invalid.append)
+            if geoip is not None:
+                entries = geoip.enrich(entries=entries)
+            yield from entries
+            if invalid and on_invalid is not None:
+                on_invalid(len(invalid))
+
+    def listen(self):
+        parser = argparse.ArgumentParser()
+        parser.add_argument('-c', '--config-file', dest='config_file', required=False, type=to_path)
+        parser.add_argument('--udp', dest='udp', type=to_address, default=None, help="Address to receive syslog over UDP, eg. 0.0.0.0:514")
+        parser.add_argument('--tcp', dest='tcp', type=to_address, default=None, help="Address to receive syslog over TCP (octet counting or newline framing)")
+        parser.add_argument('--index', dest='elasticsearch_index', required=False, default=None, help="Index to send received logs to, without it parsed logs are printed as JSON")
+        parser.add_argument('--pipeline', dest='elasticsearch_pipeline', required=False, help="Name of the Ingest Pipeline")
+        self.add_id_arguments(parser=parser)
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=500, help="Max number of documents per bulk request")
+        parser.add_argument('--max-chunk-bytes', dest='max_chunk_bytes', type=int, default=10 * 1024 * 1024, help="Max size of bulk request body in bytes")
+        parser.add_argument('--max-workers', dest='max_workers', type=int, default=4, help="Number of concurrent bulk requests")
+        parser.add_argument('--max-pending', dest='max_pending', type=int, default=None, help="Max number of bulk batches queued for indexing, defaults to 2x max workers")
+        parser.add_argument('--flush-interval', dest='flush_interval', type=float, default=1.0, help="Send incomplete bulk batch once its oldest document waits this many seconds")
+        parser.add_argument('--queue-size', dest='queue_size', type=int, default=1000, help="Max number of received batches waiting for parsing, UDP messages are dropped beyond it")
+        parser.add_argument('--receive-buffer', dest='receive_buffer', type=int, default=8 * 1024 * 1024, help="UDP socket receive buffer size in bytes")
+        parser.add_argument('--report-interval', dest='report_interval', type=float, default=10.0, help="Seconds between receive counter reports")
+        parser.add_argument('--geoip-db', dest='geoip_db', type=to_path, default=None, help="ipinfo country_asn CSV or compiled index used to add country/ASN fields for srcip/dstip")
+        parser.add_argument('--prefer-eventtime', dest='prefer_epoch', action='store_true', default=False, help="Build @timestamp from eventtime/itime fields when present")
+        parser.add_argument('--timestamp-format', dest='timestamp_format', choices=['datetime', 'epoch', 'epoch_millis'], default='datetime', help="Type of @timestamp values sent to Elasticsearch")
+        self.add_fields_argument(parser=parser)
+        self.add_schema_argument(parser=parser)
+        parser.description = "Receive FortiGate syslog over UDP/TCP and send it to Elasticsearch"
+        parser.usage = "flp listen [<args>]"
+        args = parser.parse_args(sys.argv[2:])
+        if args.udp is None and args.tcp is None:
+            parser.error("At least one of --udp or --tcp is required")
+        if args.elasticsearch_index is not None:
+            self.check_id_options(parser=parser, args=args)
+        self.CONFIG = get_config(args=sys.argv)
+
+        receiver = SyslogReceiver(udp=args.udp, tcp=args.tcp, max_queue=args.queue_size, receive_buffer=args.receive_buffer, encoding=self.CONFIG.ENCODING, errors=self.CONFIG.ENCODING_ERRORS, report_interval=args.report_interval)
+        receiver.start()
+        stop_event = threading.Event()
+        timestamp_options = dict(prefer_epoch=args.prefer_epoch, output=args.timestamp_format)
+        geoip = self.get_geoip_enricher(args=args)
+        documents = self.batch_documents(batches=receiver.batches(stop_event=stop_event), timestamp_options=timestamp_options, geoip=geoip, fields=args.fields, schema=self.get_schema(args=args), on_invalid=receiver.add_invalid)
+        if args.elasticsearch_index is None:
+            try:
+                for line in LogLoader.format(entries=(x for x in documents if x is not None), format='json'):
+                    print(line)
+            except KeyboardInterrupt:
+                stop_event.set()
+                receiver.stop()
+            return
+        ei = ElasticIndexer(
+            client=self.get_elastic_client(),
+            index_name=args.elasticsearch_index,
+            pipeline=args.elasticsearch_pipeline,
+            **self.get_id_options(args=args, geoip=geoip),
+            stop_event=stop_event
+        )
+        try:
+            ei.bulk_index_data(data=documents, max_workers=args.max_workers, chunk_size=args.chunk_size, max_chunk_bytes=args.max_chunk_bytes, max_pending=args.max_pending, flush_interval=args.flush_interval)
+        finally:
+            receiver.stop()
+
+    def replay(self):
+        parser = argparse.ArgumentParser()
+        parser.add_argument('-c', '--config-file', dest='config_file', required=False, type=to_path)
+        parser.add_argument('-i', '--input-file', dest='input_files', action='append', required=True, type=to_paths, help="Log file, directory or glob pattern, can be repeated")
+        parser.add_argument('--target', dest='target', type=to_address, default=('127.0.0.1', 514), help="Syslog receiver address, default 127.0.0.1:514")
+        parser.add_argument('--protocol', dest='protocol', choices=['udp', 'tcp'], default='udp')
+        parser.add_argument('--framing', dest='framing', choices=['octet', 'newline'], default='octet', help="TCP message framing")
+        parser.add_argument('--rate', dest='rate', type=float, default=None, help="Messages per second, as fast as possible by default")
+        parser.add_argument('--head', dest='head', type=int, default=None, help="Number of lines to send per file")
+        parser.description = "Send log files to syslog receiver, for testing flp listen"
+        parser.usage = "flp replay [<args>]"
+        args = parser.parse_args(sys.argv[2:])
+        self.CONFIG = get_config(args=sys.argv)
+        for input_file in itertools.chain.from_iterable(args.input_files):
+            lines = LogLoader.read_lines(file=input_file)
+            if args.head is not None:
+                lines = LogLoader.head(lines, count=args.head)
+            sent, elapsed = replay(lines=lines, host=args.target[0], port=args.target[1], protocol=args.protocol, rate=args.rate, framing=args.framing)
+            print(f"Sent {sent} messages from {input_file} in {elapsed:.2f} s ({sent / elapsed if elapsed else 0:.0f}/s)")
+
+    def template(self):
+        parser = argparse.ArgumentParser()
+        parser.add_argument('-c', '--config-file', dest='config_file', required=False, type=to_path)
+        parser.add_argument('--name', dest='name', default='flp', help="Index template name")
+        parser.add_argument('--index-pattern', dest='index_patterns', action='append', default=None, help="Index pattern the template applies to, can be repeated, default flp-*")
+        parser.add_argument('--priority', dest='priority', type=int, default=200)
+        parser.add_argument('--timestamp-format', dest='timestamp_format', choices=['datetime', 'epoch', 'epoch_millis'], default='datetime', help="Type of @timestamp values sent by flp index --timestamp-format")
+        parser.add_argument('--put', dest='put', action='store_true', default=False, help="Create or update the template in Elasticsearch instead of printing it")
+        parser.description = "Output Elasticsearch index template with field types of the --schema conversion"
+        parser.usage = "flp template [<args>]"
+        args = parser.parse_args(sys.argv[2:])
+        self.CONFIG = get_config(args=sys.argv)
+        body = SCHEMAS.index_template(index_patterns=args.index_patterns or ['flp-*'], priority=args.priority, timestamp_format=args.timestamp_format)
+        if not args.put:
+            print(json.dumps(body, indent=2))
+            return
+        self.get_elastic_client().indices.put_index_template(name=args.name, **body)
+        print(f"Index template {args.name} stored for {', '.join(body['index_patterns'])}")
+
+    def get_elastic_client_options(self) -> dict:
+        return dict(
             hosts=self.CONFIG.elasticsearch.url,
             basic_auth=(self.CONFIG.elasticsearch.username, self.CONFIG.elasticsearch.password),
             ca_certs=self.CONFIG.elasticsearch.ca_cert,
             verify_certs=False,
             ssl_show_warn=False
         )
-        id_key = "msg_id"
-        if args.id_key is not None:
-            id_key = args.id_key
-        ei = ElasticIndexer(client=es_client, index_name=args.elasticsearch_index, pipeline=args.elasticsearch_pipeline, id_key=id_key)
-        total_records = 0
-        for input_file in input_files:
-            total_records = LogLoader.get_size(file=input_file)
-            print(f"Total records to index: {total_records}")
-            lines = LogLoader.read_lines(file=input_file)
-            head = args.head
-            if head is not None:
-                lines = itertools.islice(lines, head)
-            entries = LogLoader.re_parse_lines(lines=lines)
-            entries = LogLoader.add_timestamp(entries=entries)
-            if self.CONFIG.enrich is not None:
-                entries = LogLoader.enrich_documents(entries=entries, enrich_dict=self.CONFIG.enrich)
-            ei.index_data(data=entries, total_records=total_records)
 
+    def get_elastic_client(self) -> Elasticsearch:
+        return Elasticsearch(**self.get_elastic_client_options())
+
+    def index_file(self, input_file: pathlib.Path, indexer: ElasticIndexer, args: argparse.Namespace, max_workers: int, geoip: GeoIpEnricher = None):
+        total_records = None
+        read_progress = ReadProgress(path=input_file)
+        start_line = args.start_line
+        checkpoint = None
+        if args.checkpoint:
+            checkpoint = Checkpoint(file=input_file, index_name=args.elasticsearch_index)
+            resume_line = checkpoint.load()
+            if checkpoint.completed:
+                print(f"{input_file} already indexed, skipping")
+                return
+            if resume_line:
+                print(f"Resuming {input_file} from line {resume_line}")
+                start_line = resume_line
+            else:
+                checkpoint.start_line = checkpoint.line = start_line
+        if args.count_records:
+            if args.log_filter is not None:
+                total_records = sum(1 for _ in LogLoader.re_parse_lines(lines=LogLoader.read_lines(file=input_file, start_line=start_line), log_filter=args.log_filter))
+            else:
+                total_records = LogLoader.get_size(file=input_file) - start_line
+            print(f"Total records to index: {total_records}")
+        lines = LogLoader.read_lines(file=input_file, progress=read_progress, start_line=start_line, decompress_workers=args.decompress_workers)
+        head = args.head
+        if head is not None:
+            lines = itertools.islice(lines, head)
+            if checkpoint is not None:
+                # Next run resumes after the indexed lines instead of skipping the file
+                checkpoint.partial = True
+            if total_records is None or head < total_records:
+                total_records = head
+        timestamp_options = dict(prefer_epoch=args.prefer_epoch, output=args.timestamp_format)
+        if args.workers is not None:
+            # Checkpoint counts documents in order, so records must not be reordered
+            ordered = args.ordered or checkpoint is not None
+            if self.use_ranges(input_file=input_file, args=args, start_line=start_line):
+                entries = LogLoader.parallel_parse_file(file=input_file, workers=args.workers, ordered=ordered, enrich_dict=self.CONFIG.enrich, timestamp_options=timestamp_options, progress=read_progress, log_filter=args.log_filter, fields=args.fields, schema=self.get_schema(args=args))
+            else:
+                entries = LogLoader.parallel_parse_lines(lines=lines, workers=args.workers, ordered=ordered, enrich_dict=self.CONFIG.enrich, timestamp_options=timestamp_options, log_filter=args.log_filter, fields=args.fields, schema=self.get_schema(args=args))
+        else:
+            entries = LogLoader.parse_entries(lines=lines, enrich_dict=self.CONFIG.enrich, timestamp_options=timestamp_options, log_filter=args.log_filter, fields=args.fields, schema=self.get_schema(args=args))
+        if geoip is not None:
+            entries = geoip.enrich(entries=entries)
+        if args.bulk:
+            return indexer.bulk_index_data(data=entries, total_records=total_records, max_workers=max_workers, chunk_size=args.chunk_size, max_chunk_bytes=args.max_chunk_bytes, max_pending=args.max_pending, read_progress=read_progress, checkpoint=checkpoint)
+        else:
+            return indexer.index_data(data=entries, total_records=total_records, max_workers=max_workers, max_pending=args.max_pending, read_progress=read_progress, checkpoint=checkpoint)
 
-            
 
 def main():
     Cli()
\ No newline at end of file
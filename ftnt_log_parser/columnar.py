@@ -0,0 +1,143 @@
+import datetime
+from array import array
+from typing import Dict, Iterable, List, Set, Tuple
+import numpy as np
+import pandas as pd
+
+
+# Low cardinality fields, stored as integer codes and turned into categoricals
+CATEGORY_FIELDS = {
+    'action', 'app', 'appcat', 'apprisk', 'devid', 'devname', 'dstcountry', 'dstintf', 'dstintfrole',
+    'eventtype', 'level', 'logid', 'policyid', 'policytype', 'proto', 'service', 'srccountry', 'srcintf',
+    'srcintfrole', 'subtype', 'trandisp', 'type', 'tz', 'utmaction', 'vd',
+}
+
+# Integer fields, stored as int64 arrays with a missing-value mask
+NUMERIC_FIELDS = {
+    'duration', 'dstport', 'eventtime', 'itime', 'rcvdbyte', 'rcvdpkt', 'sentbyte', 'sentpkt',
+    'sessionid', 'srcport', 'transport', 'tranport', '@timestamp',
+}
+
+
+class ColumnarBuilder:
+    """
+    Accumulates parsed records straight into per-column buffers instead of keeping a dict per row.
+
+    Keys missing from a record are filled with nulls. A numeric field holding any non-numeric value
+    becomes an object column of strings. '@timestamp' is expected as epoch seconds
+    (see TimestampParser output='epoch') and converted to datetime column in timezone.
+    With fields, other keys are skipped and columns are ordered as in fields.
+    """
+
+    def __init__(self, category_fields: Set[str] = None, numeric_fields: Set[str] = None, timezone: datetime.tzinfo = None, ts_key: str = '@timestamp', fields: List[str] = None) -> None:
+        self.category_fields = category_fields if category_fields is not None else CATEGORY_FIELDS
+        self.numeric_fields = numeric_fields if numeric_fields is not None else NUMERIC_FIELDS
+        self.timezone = timezone
+        self.ts_key = ts_key
+        self.fields = fields
+        self.rows = 0
+        self.columns: List[str] = []
+        self.kinds: Dict[str, str] = {}
+        self.objects: Dict[str, list] = {}
+        self.categories: Dict[str, Tuple[dict, array]] = {}
+        self.numerics: Dict[str, Tuple[array, bytearray]] = {}
+
+    def add_column(self, key: str) -> str:
+        if self.fields is not None and key not in self.fields:
+            self.kinds[key] = 'skip'
+            return 'skip'
+        self.columns.append(key)
+        if key in self.category_fields:
+            self.categories[key] = ({}, array('i'))
+            kind = 'category'
+        elif key in self.numeric_fields:
+            self.numerics[key] = (array('q'), bytearray())
+            kind = 'numeric'
+        else:
+            self.objects[key] = []
+            kind = 'object'
+        self.kinds[key] = kind
+        return kind
+
+    def append(self, record: dict):
+        # Columns are padded lazily, only when a value is appended after missing rows
+        row = self.rows
+        for key, value in record.items():
+            kind = self.kinds.get(key)
+            if kind is None:
+                kind = self.add_column(key)
+            if kind == 'skip':
+                continue
+            if kind == 'object' or kind == 'text':
+                column = self.objects[key]
+                if len(column) < row:
+                    column.extend([None] * (row - len(column)))
+                column.append(value if kind == 'object' or value is None else str(value))
+            elif kind == 'category':
+                mapping, codes = self.categories[key]
+                code = mapping.get(value)
+                if code is None:
+                    code = mapping[value] = len(mapping)
+                if len(codes) < row:
+                    codes.extend(array('i', [-1]) * (row - len(codes)))
+                codes.append(code)
+            else:
+                values, mask = self.numerics[key]
+                if len(values) < row:
+                    values.extend(array('q', [0]) * (row - len(values)))
+                    mask.extend(b'\x01' * (row - len(mask)))
+                try:
+                    values.append(int(value))
+                    mask.append(0)
+                except (TypeError, ValueError, OverflowError):
+                    if value is None:
+                        values.append(0)
+                        mask.append(1)
+                    else:
+                        self.to_text(key=key).append(str(value))
+        self.rows += 1
+
+    def to_text(self, key: str) -> list:
+        # Column with a non-numeric value is kept as text instead of losing the value, all values
+        # (earlier and later ones) are str so the column is not mixed int/str
+        values, mask = self.numerics.pop(key)
+        column = self.objects[key] = [None if missing else str(x) for x, missing in zip(values, mask)]
+        self.kinds[key] = 'text'
+        return column
+
+    def extend(self, records: Iterable[dict]):
+        for record in records:
+            self.append(record=record)
+        return self
+
+    def pad(self):
+        rows = self.rows
+        for column in self.objects.values():
+            column.extend([None] * (rows - len(column)))
+        for _, codes in self.categories.values():
+            codes.extend(array('i', [-1]) * (rows - len(codes)))
+        for values, mask in self.numerics.values():
+            values.extend(array('q', [0]) * (rows - len(values)))
+            mask.extend(b'\x01' * (rows - len(mask)))
+
+    def to_dataframe(self) -> pd.DataFrame:
+        self.pad()
+        data = {}
+        columns = self.columns
+        if self.fields is not None:
+            columns = [x for x in self.fields if x in columns]
+        for key in columns:
+            if key in self.objects:
+                data[key] = pd.Series(self.objects.pop(key), dtype=object)
+            elif key in self.categories:
+                mapping, codes = self.categories.pop(key)
+                data[key] = pd.Categorical.from_codes(codes=np.frombuffer(codes, dtype=np.int32), categories=list(mapping))
+            else:
+                values, mask = self.numerics.pop(key)
+                column = pd.arrays.IntegerArray(np.frombuffer(values, dtype=np.int64), np.frombuffer(mask, dtype=np.bool_))
+                if key == self.ts_key:
+                    column = pd.to_datetime(pd.Series(column) * 10**9, unit='ns', utc=True)
+                    if self.timezone is not None:
+                        column = column.dt.tz_convert(self.timezone)
+                data[key] = column
+        return pd.DataFrame(data=data)
@@ -3,19 +3,39 @@ from email.generator import Generator
 from itertools import zip_longest
 import re
 import itertools
+import functools
 import datetime
 import gzip
 import tarfile
 import pathlib
 import shlex
 import json
-from typing import Iterable, Union, Literal, Generator, Dict
+import collections
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from typing import Callable, Iterable, Union, Literal, Generator, Dict, List
 import pandas as pd
 
 from ftnt_log_parser.config import CONFIG
-from ftnt_log_parser.utils import dict_update_path
+from ftnt_log_parser.utils import compile_template, merge_template, ReadProgress
+from ftnt_log_parser.tokenizer import parse_line, parse_fields
+from ftnt_log_parser.timestamps import EPOCH_FIELDS, SOURCE_FIELDS, TimestampParser
+from ftnt_log_parser.filters import LogFilter
+from ftnt_log_parser.columnar import CATEGORY_FIELDS, NUMERIC_FIELDS, ColumnarBuilder
+from ftnt_log_parser.schemas import SchemaRegistry
+from ftnt_log_parser.interning import CompactRecord, Interner, RecordCompactor
+from ftnt_log_parser.gzip_index import CHUNK_SIZE, IndexedReader, parallel_decompress
+from ftnt_log_parser.mmap_reader import open_mmap, split_ranges, iter_range, count_lines
 
 
+# Bump whenever parsed output changes, invalidates cached DataFrames
+PARSER_VERSION = 2
+
+# Shared, so enum values are interned across files
+SCHEMAS = SchemaRegistry()
+
+# Keys selecting the schema of a record
+SCHEMA_FIELDS = ('type', 'subtype')
+
 LOG_KEY_PATTERN = re.compile(pattern=r"(?:^| )(?P<key>[a-z_]+)=", flags=re.MULTILINE)
 
 def pairwise(data):
@@ -27,32 +47,71 @@ class LogLoader:
         self.config = CONFIG
 
     @staticmethod
-    def read_plaintext(file: pathlib.Path) -> Generator[str, None, None]:
-        with file.open(mode='r', encoding=CONFIG.ENCODING) as f:
-            for line in f.readlines():
-                yield line.strip()
+    def split_chunks(chunks: Iterable[bytes], encoding: str = None, errors: str = None) -> Generator[str, None, None]:
+        # Lines are cut at the last newline of each chunk and the complete part is decoded at once,
+        # so multi-byte characters are never split and undecodable bytes don't stop reading
+        encoding = encoding or CONFIG.ENCODING
+        errors = errors or CONFIG.ENCODING_ERRORS
+        rest = b''
+        for data in chunks:
+            if rest:
+                data = rest + data
+            last_newline = data.rfind(b'\n')
+            if last_newline == -1:
+                rest = data
+                continue
+            rest = data[last_newline + 1:]
+            text = data[:last_newline + 1].decode(encoding=encoding, errors=errors)
+            if '\r' in text:
+                text = text.replace('\r\n', '\n')
+            yield from text[:-1].split('\n')
+        if rest:
+            yield rest.decode(encoding=encoding, errors=errors).rstrip('\r')
 
     @staticmethod
-    def read_gzip(file: pathlib.Path) -> Generator[str, None, None]:
-        with gzip.open(file) as f:
-            for line in f:
-                try:
-                    yield line.decode(encoding='utf-8').strip()
-                except UnicodeDecodeError as e:
-                    print(f"Failed to decode line as UTF-8. Line: {line}, Exception: {repr(e)}")
+    def iter_chunks(f, chunk_size: int = CHUNK_SIZE) -> Generator[bytes, None, None]:
+        return iter(lambda: f.read(chunk_size), b'')
+
+    @staticmethod
+    def read_plaintext(file: pathlib.Path, progress: ReadProgress = None) -> Generator[str, None, None]:
+        with file.open(mode='rb', buffering=0) as raw:
+            if progress is not None:
+                progress.attach(raw)
+            yield from LogLoader.split_chunks(chunks=LogLoader.iter_chunks(raw))
+        if progress is not None:
+            progress.finished = True
 
+    @staticmethod
+    def read_gzip(file: pathlib.Path, progress: ReadProgress = None) -> Generator[str, None, None]:
+        with file.open(mode='rb') as raw, gzip.GzipFile(fileobj=raw) as f:
+            if progress is not None:
+                progress.attach(raw)
+            yield from LogLoader.split_chunks(chunks=LogLoader.iter_chunks(f))
+        if progress is not None:
+            progress.finished = True
+
+    @staticmethod
+    def read_parallel_gzip(file: pathlib.Path, workers: int = None, progress: ReadProgress = None) -> Generator[str, None, None]:
+        # Gzip members are decompressed in worker processes, lines are split here in file order
+        with file.open(mode='rb') as raw:
+            if progress is not None:
+                progress.attach(raw)
+            yield from LogLoader.split_chunks(chunks=parallel_decompress(file=file, workers=workers, progress_raw=raw))
+        if progress is not None:
+            progress.finished = True
 
     @staticmethod
-    def read_tar(file: pathlib.Path) -> Generator[str, None, None]:
-        tar = tarfile.open(file, "r:gz")
-        for member in tar.getmembers():
-            f = tar.extractfile(member)
-            if f is not None:
-                for line in f:
-                    try:
-                        yield line.decode(encoding='utf-8').strip()
-                    except UnicodeDecodeError as e:
-                        print(f"Failed to decode line as UTF-8. Line: {line}, Exception: {repr(e)}")
+    def read_tar(file: pathlib.Path, progress: ReadProgress = None) -> Generator[str, None, None]:
+        # Stream mode reads members in order, so the archive is decompressed only once
+        with file.open(mode='rb') as raw, tarfile.open(fileobj=raw, mode="r|gz") as tar:
+            if progress is not None:
+                progress.attach(raw)
+            for member in tar:
+                f = tar.extractfile(member)
+                if f is not None:
+                    yield from LogLoader.split_chunks(chunks=LogLoader.iter_chunks(f))
+        if progress is not None:
+            progress.finished = True
 
     @staticmethod
     def determine_filetype(file: pathlib.Path) -> Literal['plain', 'gz', 'tgz']:
@@ -66,77 +125,212 @@ class LogLoader:
             return None
     
     @staticmethod
-    def read_lines(file: pathlib.Path, compression_type: Literal['plain', 'gz', 'tgz', None] = None) -> Generator[str, None, None]:
+    def read_lines(file: pathlib.Path, compression_type: Literal['plain', 'gz', 'tgz', None] = None, progress: ReadProgress = None, start_line: int = 0, decompress_workers: int = None) -> Generator[str, None, None]:
         if compression_type is None:
             compression_type = LogLoader.determine_filetype(file=file)
         
+        if start_line:
+            # Jump close to start_line using sidecar index, tar streams can only be skipped through
+            if compression_type == 'tgz':
+                return itertools.islice(LogLoader.read_tar(file=file, progress=progress), start_line, None)
+            reader = IndexedReader(file=file, compression_type=compression_type, encoding=CONFIG.ENCODING, errors=CONFIG.ENCODING_ERRORS)
+            return reader.read_lines(start_line=start_line, progress=progress)
         if compression_type == 'plain':
-            return LogLoader.read_plaintext(file=file)
+            return LogLoader.read_plaintext(file=file, progress=progress)
         elif compression_type == 'gz':
-            return LogLoader.read_gzip(file=file)
+            if decompress_workers is not None:
+                return LogLoader.read_parallel_gzip(file=file, workers=decompress_workers, progress=progress)
+            return LogLoader.read_gzip(file=file, progress=progress)
         elif compression_type == 'tgz':
-            return LogLoader.read_tar(file=file)
+            return LogLoader.read_tar(file=file, progress=progress)
     
     def get_size(file: pathlib.Path):
-        counter = 0
-        for line in LogLoader.read_lines(file=file):
-            counter += 1
-        return counter
+        compression_type = LogLoader.determine_filetype(file=file)
+        if compression_type == 'plain':
+            with open_mmap(file=file) as mm:
+                return count_lines(iter_range(mm, 0, len(mm))) if mm is not None else 0
+        elif compression_type == 'gz':
+            with gzip.open(file, mode='rb') as f:
+                return count_lines(LogLoader.iter_chunks(f))
+        elif compression_type == 'tgz':
+            counter = 0
+            with tarfile.open(file, mode="r|gz") as tar:
+                for member in tar:
+                    f = tar.extractfile(member)
+                    if f is not None:
+                        counter += count_lines(LogLoader.iter_chunks(f))
+            return counter
+        return sum(1 for _ in LogLoader.read_lines(file=file))
 
     @staticmethod
-    def re_parse_lines(lines: Iterable[str]) -> Generator[Dict, None, None]:
-        for line in lines:
-            kv_list = LOG_KEY_PATTERN.split(string=line)[1:]
-            data = {k: v.strip('"') for k, v in pairwise(kv_list)}
-            yield data
+    def re_parse_lines(lines: Iterable[str], log_filter: LogFilter = None, fields: Iterable[str] = None, schema: SchemaRegistry = None) -> Generator[Dict, None, None]:
+        # With fields, only those keys (and keys used by log_filter, type/subtype selecting the schema) are extracted
+        parse = parse_line
+        if fields is not None:
+            fields = tuple(dict.fromkeys(itertools.chain(fields, log_filter.fields if log_filter is not None else (), SCHEMA_FIELDS if schema is not None else ())))
+            parse = functools.partial(parse_fields, fields=fields)
+        if log_filter is not None:
+            # Only lines passing the substring prefilter are parsed and evaluated
+            entries = filter(log_filter.match, map(parse, filter(log_filter.prefilter, lines)))
+        else:
+            entries = map(parse, lines)
+        if schema is not None:
+            # After filtering, filter terms compare values as parsed
+            entries = map(schema.convert, entries)
+        yield from entries
+
+    @staticmethod
+    def required_fields(fields: Iterable[str], timestamp: bool = True, prefer_epoch: bool = False, ts_key: str = '@timestamp') -> tuple:
+        # Keys to parse for fields projection, including those @timestamp is built from
+        fields = [x for x in fields if x != ts_key]
+        if timestamp:
+            fields.extend(x for x in SOURCE_FIELDS + (EPOCH_FIELDS if prefer_epoch else ()) if x not in fields)
+        return tuple(fields)
+
+    @staticmethod
+    def project(entries: Iterable[Dict], fields: Iterable[str]) -> Generator[Dict, None, None]:
+        fields = tuple(fields)
+        for entry in entries:
+            yield {key: entry[key] for key in fields if key in entry}
     
-    # TODO: Fix
     @staticmethod
     def shlex_parse_lines(lines: Iterable[str]) -> Generator[Dict, None, None]:
-        line_parts = None
-        for line in lines:
-            try:
-                line_parts = shlex.split(line)
-            except ValueError as e:
-                print(f"ERROR: Line '{line}', Exc: {repr(e)}")
-                yield None
-            else:
-                data = {k: v for k,v in [x.split('=', 1) for x in line_parts]}
-                yield data
+        # Kept for compatibility, the tokenizer handles quoting the same way shlex did
+        return LogLoader.re_parse_lines(lines=lines)
     
     @staticmethod
-    def add_timestamp(entries: Iterable[dict], ts_key: str = '@timestamp') -> Generator[Dict, None, None]:
-        timezone = CONFIG.DEFAULT_TIMEZONE
+    def add_timestamp(entries: Iterable[dict], ts_key: str = '@timestamp', prefer_epoch: bool = False, output: Literal['datetime', 'epoch', 'epoch_millis'] = 'datetime', invalid: Callable[[dict], None] = None) -> Generator[Dict, None, None]:
+        # With invalid, records without usable date/time (eg. blank or truncated lines) are passed to it and skipped
+        parser = TimestampParser(timezone=CONFIG.DEFAULT_TIMEZONE, prefer_epoch=prefer_epoch, output=output)
+        parse = parser.parse
+        if invalid is None:
+            for entry in entries:
+                entry[ts_key] = parse(entry)
+                yield entry
+            return
         for entry in entries:
-            entry_keys = list(entry.keys())
-            timstamp = None
-            tzinfo = None
-            if 'tz' in entry_keys:
-                tzinfo = datetime.datetime.strptime(entry['tz'], '%z').tzinfo
-            # else: 
-            #     timezone = CONFIG.DEFAULT_TIMEZONE
-            timestamp = datetime.datetime.strptime(f"{entry['date']}_{entry['time']}", "%Y-%m-%d_%H:%M:%S")
-            # if 'itime' in entry_keys:
-            #     timestamp = datetime.datetime.fromtimestamp(int(entry['itime']))
-            if tzinfo is not None:
-                timestamp = timestamp.replace(tzinfo=tzinfo)
-            else:
-                timestamp = timezone.localize(timestamp)
-            entry[ts_key] = timestamp
+            try:
+                entry[ts_key] = parse(entry)
+            except (KeyError, ValueError, TypeError, IndexError):
+                invalid(entry)
+                continue
             yield entry
 
     @staticmethod
-    def enrich_documents(entries: Iterable[dict], enrich_dict: dict = None):
+    def intern_entries(entries: Iterable[dict], interner: Interner = None) -> Iterable[Dict]:
+        # Keys and low cardinality values share one str object across records
+        return map(interner if interner is not None else Interner(), entries)
+
+    @staticmethod
+    def compact_entries(entries: Iterable[dict], compactor: RecordCompactor = None) -> Iterable[CompactRecord]:
+        # Tuple of values per record with shared key schema, for keeping many records in memory
+        return map(compactor if compactor is not None else RecordCompactor(interner=Interner()), entries)
+
+    @staticmethod
+    def enrich_documents(entries: Iterable[dict], enrich_dict: dict = None) -> Generator[Dict, None, None]:
         if enrich_dict is None:
+            yield from entries
+            return
+        # Paths are resolved once, each entry is updated in place
+        flat, nested = compile_template(paths=enrich_dict)
+        for entry in entries:
+            entry.update(flat)
+            if nested:
+                merge_template(target=entry, template=nested)
+            yield entry
+
+    @staticmethod
+    def chunked(iterable: Iterable, size: int) -> Generator[List, None, None]:
+        iterator = iter(iterable)
+        while chunk := list(itertools.islice(iterator, size)):
+            yield chunk
+
+    @staticmethod
+    def parse_entries(lines: Iterable[str], timestamp: bool = True, enrich_dict: dict = None, timestamp_options: dict = None, log_filter: LogFilter = None, fields: List[str] = None, schema: SchemaRegistry = None, invalid: Callable[[dict], None] = None) -> Iterable[Dict]:
+        # Parse, filter, timestamp, project and enrich, lazily
+        if fields is None:
+            entries = LogLoader.re_parse_lines(lines=lines, log_filter=log_filter, schema=schema)
+        else:
+            timestamp = timestamp and '@timestamp' in fields
+            entries = LogLoader.re_parse_lines(lines=lines, log_filter=log_filter, fields=LogLoader.required_fields(fields=fields, timestamp=timestamp, prefer_epoch=(timestamp_options or {}).get('prefer_epoch', False)), schema=schema)
+        if timestamp:
+            entries = LogLoader.add_timestamp(entries=entries, invalid=invalid, **(timestamp_options or {}))
+        if fields is not None:
+            entries = LogLoader.project(entries=entries, fields=fields)
+        if enrich_dict is not None:
+            entries = LogLoader.enrich_documents(entries=entries, enrich_dict=enrich_dict)
+        return entries
+
+    @staticmethod
+    def parse_chunk(lines: List[str], timestamp: bool = True, enrich_dict: dict = None, timestamp_options: dict = None, log_filter: LogFilter = None, fields: List[str] = None, schema: SchemaRegistry = None) -> List[Dict]:
+        return list(LogLoader.parse_entries(lines, timestamp, enrich_dict, timestamp_options, log_filter, fields, schema))
+
+    @staticmethod
+    def parse_range(path: str, start: int, end: int, timestamp: bool = True, enrich_dict: dict = None, timestamp_options: dict = None, log_filter: LogFilter = None, fields: List[str] = None, schema: SchemaRegistry = None) -> List[Dict]:
+        # Runs in worker process, lines are read from the file directly instead of being sent over
+        with open_mmap(file=pathlib.Path(path)) as mm:
+            lines = list(LogLoader.split_chunks(chunks=iter_range(mm, start, end)))
+        return LogLoader.parse_chunk(lines, timestamp, enrich_dict, timestamp_options, log_filter, fields, schema)
+
+    @staticmethod
+    def run_parallel(executor: ProcessPoolExecutor, tasks: Iterable[tuple], ordered: bool = True, on_done=None) -> Generator[Dict, None, None]:
+        # tasks yields (func, *args) returning lists of records. At most 2 tasks per worker
+        # are in flight, so producing tasks stalls when workers fall behind
+        max_pending = executor._max_workers * 2
+        pending = collections.deque()
+        task_args = {}
+
+        def results(future):
+            entries = future.result()
+            if on_done is not None:
+                on_done(*task_args.pop(future))
             return entries
+
+        for func, *args in tasks:
+            if len(pending) >= max_pending:
+                if ordered:
+                    yield from results(pending.popleft())
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                        yield from results(future)
+            future = executor.submit(func, *args)
+            task_args[future] = args
+            pending.append(future)
+        if ordered:
+            while pending:
+                yield from results(pending.popleft())
         else:
-            for entry in entries:
-                entry_keys = list(entry.keys())
-                for multikey, value in enrich_dict.items():
-                    entry = dict_update_path(orig=entry, path=multikey, value=value)
-                yield entry
-                        
-    
+            for future in as_completed(list(pending)):
+                yield from results(future)
+
+    @staticmethod
+    def parallel_parse_file(file: pathlib.Path, workers: int = None, range_size: int = 8 * 1024 * 1024, ordered: bool = True, timestamp: bool = True, enrich_dict: dict = None, timestamp_options: dict = None, progress: ReadProgress = None, log_filter: LogFilter = None, fields: List[str] = None, schema: SchemaRegistry = None) -> Generator[Dict, None, None]:
+        # Plaintext only, the file is split into newline aligned ranges parsed by workers straight from mmap
+        ranges = split_ranges(file=file, range_size=range_size)
+        tasks = ((LogLoader.parse_range, str(file), start, end, timestamp, enrich_dict, timestamp_options, log_filter, fields, schema) for start, end in ranges)
+        with file.open(mode='rb') as raw, ProcessPoolExecutor(max_workers=workers) as executor:
+            on_done = None
+            if progress is not None:
+                progress.attach(raw)
+
+                def on_done(path, start, end, *args):
+                    raw.seek(max(raw.tell(), end))
+            yield from LogLoader.run_parallel(executor=executor, tasks=tasks, ordered=ordered, on_done=on_done)
+        if progress is not None:
+            progress.finished = True
+
+    @staticmethod
+    def parallel_parse_lines(lines: Iterable[str], workers: int = None, chunk_size: int = 1000, ordered: bool = True, timestamp: bool = True, enrich_dict: dict = None, timestamp_options: dict = None, log_filter: LogFilter = None, fields: List[str] = None, schema: SchemaRegistry = None) -> Generator[Dict, None, None]:
+        # Parse (and optionally timestamp and enrich) chunks of lines in worker processes
+        if log_filter is not None:
+            # Rejected lines are not sent to workers at all
+            lines = filter(log_filter.prefilter, lines)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            tasks = ((LogLoader.parse_chunk, chunk, timestamp, enrich_dict, timestamp_options, log_filter, fields, schema) for chunk in LogLoader.chunked(lines, size=chunk_size))
+            yield from LogLoader.run_parallel(executor=executor, tasks=tasks, ordered=ordered)
+
     def head(entries: Iterable, count: int = 10) -> Generator:
         for i in itertools.islice(entries, count):
             yield i
@@ -145,12 +339,33 @@ class LogLoader:
         for entry in entries:
             if format == 'json':
                 yield json.dumps(entry, default=str)
+            elif format == 'json-pretty':
+                yield json.dumps(entry, default=str, indent=2)
 
-    def file_to_df(file: pathlib.Path):
+    def file_to_df(file: pathlib.Path, columnar: bool = True, fields: List[str] = None, schema: SchemaRegistry = None):
+        # With fields, only those columns are parsed and built, with schema values are typed per type/subtype
         lines = LogLoader.read_lines(file=file)
-        entries = LogLoader.re_parse_lines(lines=lines)
-        entries = LogLoader.add_timestamp(entries=entries)
-        df = pd.DataFrame.from_records(data=entries)
+        timestamp = fields is None or '@timestamp' in fields
+        entries = LogLoader.re_parse_lines(lines=lines, fields=LogLoader.required_fields(fields=fields, timestamp=timestamp) if fields is not None else None, schema=schema)
+        if not columnar:
+            if timestamp:
+                entries = LogLoader.add_timestamp(entries=entries)
+            if fields is not None:
+                entries = LogLoader.project(entries=entries, fields=fields)
+            # All records are held at once before the frame is built
+            entries = LogLoader.intern_entries(entries=entries)
+            df = pd.DataFrame.from_records(data=entries)
+            return df
+        # Records are consumed one by one into typed column buffers
+        if timestamp:
+            entries = LogLoader.add_timestamp(entries=entries, output='epoch')
+        category_fields, numeric_fields = CATEGORY_FIELDS, NUMERIC_FIELDS
+        if schema is not None:
+            # Existing column types take precedence, so cached frames keep their dtypes
+            category_fields = CATEGORY_FIELDS | (schema.category_fields() - NUMERIC_FIELDS)
+            numeric_fields = NUMERIC_FIELDS | (schema.numeric_fields() - CATEGORY_FIELDS)
+        builder = ColumnarBuilder(category_fields=category_fields, numeric_fields=numeric_fields, timezone=CONFIG.DEFAULT_TIMEZONE, fields=fields)
+        df = builder.extend(records=entries).to_dataframe()
         return df
 
     
@@ -8,7 +8,7 @@ import yaml
 
 from pydantic import BaseSettings, Field, validator
 from pydantic import HttpUrl, FilePath
-from pydantic.typing import Any, Dict, Optional, Union
+from pydantic.typing import Any, Dict, List, Optional, Union
 
 
 DEFAULT_CONFIG_PATH = pathlib.Path.home().joinpath('.flpconfig.yml')
@@ -71,12 +71,21 @@ class FLPElasticConfig(FLPConfigBase):
     pipeline: Optional[str]
     id_key: Optional[str]
 
+class FLPGeoIpConfig(FLPConfigBase):
+
+    db_path: FilePath
+    fields: List[str] = Field(['srcip', 'dstip'])
+    cache_size: int = Field(65536)
+
 class FLPConfig(FLPConfigBase):
 
     elasticsearch: FLPElasticConfig = Field(FLPElasticConfig(url='http://127.0.0.1:9200', username='elastic'))
     encoding: str = Field('utf-8')
+    # Error handler used when decoding log lines, eg. 'replace' or 'surrogateescape'
+    encoding_errors: str = Field('replace')
     timezone: Any = Field("UTC")
     enrich: Optional[Dict]
+    geoip: Optional[FLPGeoIpConfig]
 
     @validator('timezone',pre=True, allow_reuse=True)
     def validate_timezone(cls, value):
@@ -90,6 +99,10 @@ class FLPConfig(FLPConfigBase):
     @property
     def ENCODING(self):
         return self.encoding
+
+    @property
+    def ENCODING_ERRORS(self):
+        return self.encoding_errors
     
     @property
     def DEFAULT_TIMEZONE(self):
@@ -99,6 +112,7 @@ class FortinetLogParserConfig:
     
     def __init__(self) -> None:
         self.ENCODING = 'utf-8'
+        self.ENCODING_ERRORS = 'replace'
         self.DEFAULT_TIMEZONE = pytz.timezone('Europe/Prague')
 
 def get_config(args: Union[Dict, Namespace] = Namespace()):
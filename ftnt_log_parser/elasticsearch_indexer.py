@@ -1,77 +1,322 @@
+import json
+import time
+import base64
+import hashlib
 import threading
 import timeit
 import datetime
-from typing import Iterable, Dict
-from elasticsearch import Elasticsearch
+from typing import Any, Callable, Iterable, Dict, List, Literal, Tuple
+from elasticsearch import ConflictError, Elasticsearch
 from elastic_transport import ObjectApiResponse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+from ftnt_log_parser.utils import ReadProgress
+from ftnt_log_parser.checkpoint import Checkpoint
+
+
+# Fields identifying a FortiOS log record, eventtime has up to ns resolution
+DEFAULT_ID_FIELDS = ['devid', 'eventtime', 'sessionid', 'logid']
+
+
+def content_id(values: Iterable[str]) -> str:
+    # 120 bit digest, 20 url-safe characters like Elasticsearch generated ids
+    digest = hashlib.blake2b('\x1f'.join(values).encode('utf-8', errors='surrogateescape'), digest_size=15).digest()
+    return base64.urlsafe_b64encode(digest).decode('ascii')
+
+
+def json_default(obj):
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    return str(obj)
 
 
 class ElasticIndexer:
 
-    def __init__(self, client: Elasticsearch, index_name: str, pipeline: str = None, id_key: str = None) -> None:
+    def __init__(self, client: Elasticsearch, index_name: str, pipeline: str = None, id_key: str = None, executor: ThreadPoolExecutor = None, label: str = None, stop_event: threading.Event = None, id_mode: Literal['key', 'fields', 'content'] = 'key', id_fields: List[str] = None, op_type: Literal['index', 'create'] = 'index', id_exclude: Iterable[str] = None) -> None:
         self.client = client
         self.index_name = index_name
         self.pipeline = pipeline
         self.id_key = id_key
+        # key: value of id_key, fields: digest of id_fields values, content: digest of all fields
+        self.id_mode = id_mode
+        self.id_fields = id_fields if id_fields is not None else DEFAULT_ID_FIELDS
+        # Keys not part of the content digest, @timestamp is derived from other fields and
+        # enrichment keys depend on the GeoIP DB and config rather than on the log record
+        self.id_exclude = frozenset(('@timestamp', *(id_exclude or ())))
+        # With 'create', documents already indexed under the same id are skipped by Elasticsearch
+        self.op_type = op_type
+        # Executor shared between several indexers caps the total number of in-flight requests
+        self.executor = executor
+        self.label = label
+        self.stop_event = stop_event
         self.total_records = 0
+        self.read_progress = None
+        self.checkpoint = None
+        self.acknowledged = 0
+        self.ack_next = 0
+        self.ack_done = {}
+        self.ack_blocked = False
         self.counter = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.next_report = 1000
         self.counter_lock = threading.Lock()
         self.start_timer = None
 
     def reset(self):
         self.total_records = 0
+        self.read_progress = None
+        self.checkpoint = None
+        self.acknowledged = 0
+        self.ack_next = 0
+        self.ack_done = {}
+        self.ack_blocked = False
         self.counter = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.next_report = 1000
         self.start_timer = None
 
-    def index_record(self, doc: dict):
+    def get_event_id(self, doc: dict):
+        if self.id_mode == 'fields':
+            values = [doc.get(x) for x in self.id_fields]
+            if all(x is not None for x in values):
+                return content_id(values=(str(x) for x in values))
+            # Some of the fields missing (eg. no eventtime on older FortiOS), which could
+            # map different records to the same id, identify by whole content instead
+            return self.get_content_id(doc=doc)
+        elif self.id_mode == 'content':
+            return self.get_content_id(doc=doc)
         event_id = None
         if self.id_key is not None:
             event_id = doc.get(self.id_key, None)
-            # TODO: Fix event_id to be more unique
-        res = self.client.index(index=self.index_name, document=doc, id=event_id, pipeline=self.pipeline)
+        return event_id
+
+    def get_content_id(self, doc: dict) -> str:
+        # Parsed fields keep the order of the log line
+        id_exclude = self.id_exclude
+        return content_id(values=(f"{k}={v}" for k, v in doc.items() if k not in id_exclude))
+
+    def add_duplicates(self, count: int):
+        with self.counter_lock:
+            self.duplicates += count
+
+    def index_record(self, doc: dict) -> int:
+        event_id = self.get_event_id(doc=doc)
+        if self.op_type == 'create' and event_id is not None:
+            try:
+                res = self.client.create(index=self.index_name, document=doc, id=event_id, pipeline=self.pipeline)
+            except ConflictError:
+                self.add_duplicates(count=1)
+                return 0
+        else:
+            res = self.client.index(index=self.index_name, document=doc, id=event_id, pipeline=self.pipeline)
         # print(res)
         if not isinstance(res, ObjectApiResponse):
             print(f"Error: {res}")
-        return res
+            return 1
+        return 0
+
+    def bulk_action(self, doc: dict) -> bytes:
+        event_id = self.get_event_id(doc=doc)
+        # create requires an id, documents without one are always indexed
+        op_type = self.op_type if event_id is not None else "index"
+        action = {op_type: {}}
+        if event_id is not None:
+            action[op_type]["_id"] = event_id
+        action_line = json.dumps(action, separators=(',', ':'))
+        doc_line = json.dumps(doc, default=json_default, separators=(',', ':'))
+        return f"{action_line}\n{doc_line}\n".encode('utf-8')
+
+    def make_batches(self, data: Iterable[Dict], chunk_size: int = 500, max_chunk_bytes: int = 10 * 1024 * 1024, flush_interval: float = None) -> Iterable[Tuple[int, List[bytes]]]:
+        # With flush_interval, batch is also sent once its first document is that many seconds old.
+        # Endless sources yield None while idle, which is passed on as (0, None) so the caller can
+        # collect finished requests
+        batch = []
+        batch_bytes = 0
+        batch_start = None
+        for doc in data:
+            if doc is not None:
+                operation = self.bulk_action(doc=doc)
+                if len(batch) and (len(batch) >= chunk_size or batch_bytes + len(operation) > max_chunk_bytes):
+                    yield len(batch), batch
+                    batch = []
+                    batch_bytes = 0
+                if not len(batch):
+                    batch_start = time.monotonic()
+                batch.append(operation)
+                batch_bytes += len(operation)
+            if flush_interval is not None and len(batch) and time.monotonic() - batch_start >= flush_interval:
+                yield len(batch), batch
+                batch = []
+                batch_bytes = 0
+            if doc is None:
+                yield 0, None
+        if len(batch):
+            yield len(batch), batch
+
+    def index_batch(self, batch: List[bytes]) -> int:
+        res = self.client.bulk(operations=b"".join(batch), index=self.index_name, pipeline=self.pipeline)
+        return self.count_failed(res=res, batch=batch)
+
+    def count_failed(self, res, batch: List[bytes]) -> int:
+        failed = []
+        duplicates = 0
+        if res.get('errors'):
+            for item in res['items']:
+                # Each item is {"<op_type>": {"status": ..., "error": ...}}
+                op_type, result = next(iter(item.items()))
+                if op_type == 'create' and result.get('status') == 409:
+                    # Already indexed by earlier or retried run
+                    duplicates += 1
+                elif result.get('status', 500) >= 300:
+                    failed.append(result)
+        if duplicates:
+            self.add_duplicates(count=duplicates)
+        if len(failed):
+            print(f"Error: {len(failed)} of {len(batch)} documents rejected, first error: status {failed[0].get('status')}, {failed[0].get('error')}")
+        return len(failed)
 
-                
+    def progress_fraction(self) -> float:
+        if self.total_records:
+            return self.counter / self.total_records
+        elif self.read_progress is not None:
+            return self.read_progress.fraction
+        return 0.0
 
+    def report_progress(self, count: int, failed: int = 0):
+        with self.counter_lock:
+            self.counter += count
+            self.failed += failed
+            if self.counter >= self.next_report:
+                self.next_report = (self.counter // 1000 + 1) * 1000
+                elapsed_time = timeit.default_timer() - self.start_timer
+                average_time = elapsed_time / self.counter
+                fraction = self.progress_fraction()
+                if self.total_records:
+                    total = f"{self.total_records}"
+                elif fraction:
+                    # Estimated from the share of the input file consumed so far
+                    total = f"~{int(self.counter / fraction)}"
+                else:
+                    total = "?"
+                if fraction:
+                    estimated_remaining = datetime.timedelta(seconds=elapsed_time * (1 - fraction) / fraction)
+                else:
+                    estimated_remaining = "?"
+                prefix = f"[{self.label}] " if self.label is not None else ""
+                print(f"{prefix}Indexed: {self.counter} of {total} ({fraction*100:.2f} %)\nFailed: {self.failed}\nElapsed Time: {datetime.timedelta(seconds=elapsed_time)}\nAverage Time: {average_time} s\nEstimated Remaining {estimated_remaining}\n")
 
-    def progress_callback(self, future):
-        if future._state == "CANCELLED":
+    def progress_callback(self, future, count: int = 1) -> bool:
+        # Returns False if the request itself failed, ie. documents were not acknowledged
+        if future.cancelled():
+            return False
+        try:
+            failed = future.result()
+        except Exception as e:
+            print(f"Error during indexing: {repr(e)}")
+            self.report_progress(count=count, failed=count)
+            return False
+        self.report_progress(count=count, failed=failed)
+        return True
+
+    def acknowledge(self, sequence: int, count: int, ok: bool):
+        # Advance checkpoint over the contiguous prefix of finished tasks. Tasks finish
+        # out of order and a failed request stops the checkpoint, so it is resent on resume
+        if self.checkpoint is None or self.ack_blocked:
             return
-        self.counter_lock.acquire()
-        self.counter += 1
-        if self.counter % 1000 == 0:
-            elapsed_time = timeit.default_timer() - self.start_timer
-            average_time = elapsed_time / self.counter
-            estimated_remaining = (self.total_records - self.counter) * average_time
-            print(f"Indexed: {self.counter} of {self.total_records} ({(self.counter/self.total_records)*100} %)\nElapsed Time: {datetime.timedelta(seconds=elapsed_time)}\nAverage Time: {average_time} s\nEstimated Remaining {datetime.timedelta(seconds=estimated_remaining)}\n")
+        self.ack_done[sequence] = (count, ok)
+        advanced = False
+        while self.ack_next in self.ack_done:
+            count, ok = self.ack_done.pop(self.ack_next)
+            if not ok:
+                self.ack_blocked = True
+                self.ack_done.clear()
+                break
+            self.acknowledged += count
+            self.ack_next += 1
+            advanced = True
+        if advanced:
+            self.checkpoint.acknowledge(count=self.acknowledged)
 
-        if hasattr(future, 'exception') and future.exception():
-            print(f"Error during indexing: {repr(future.exception())}")
+    def handle_done(self, future, count: int, sequence: int):
+        ok = self.progress_callback(future=future, count=count)
+        self.acknowledge(sequence=sequence, count=count, ok=ok)
 
-        # Print the response regardless of whether it's an ObjectApiResponse
-        res = future.result()
-        # print(f"Response: {res}")
+    def run_bounded(self, tasks: Iterable[Tuple[Callable, Any, int]], max_workers: int, max_pending: int = None) -> Tuple[int, int]:
+        # Submit tasks with at most max_pending of them queued or running, reading
+        # from tasks stalls until a slot frees up so memory stays flat
+        if max_pending is None:
+            max_pending = max_workers * 2
+        max_pending = max(max_pending, max_workers)
+        own_executor = self.executor is None
+        executor = ThreadPoolExecutor(max_workers=max_workers) if own_executor else self.executor
+        self.start_timer = timeit.default_timer()
+        pending = {}
+        completed = False
+        sequence = 0
+        try:
+            for task in tasks:
+                if self.stop_event is not None and self.stop_event.is_set():
+                    raise KeyboardInterrupt
+                if task is None:
+                    # Idle source, only collect requests finished meanwhile
+                    for future in [x for x in pending if x.done()]:
+                        self.handle_done(future, *pending.pop(future))
+                    continue
+                func, arg, count = task
+                if len(pending) >= max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self.handle_done(future, *pending.pop(future))
+                pending[executor.submit(func, arg)] = (count, sequence)
+                sequence += 1
+            for future in as_completed(list(pending)):
+                self.handle_done(future, *pending.pop(future))
+            completed = True
+        except KeyboardInterrupt:
+            for future in pending:
+                future.cancel()
+            # Requests already running are finished, so their documents can be acknowledged
+            wait(pending)
+            for future, (count, sequence) in sorted(pending.items(), key=lambda x: x[1][1]):
+                self.handle_done(future, count, sequence)
+            print("KeyboardInterrup: Exiting")
+        except Exception:
+            for future in pending:
+                future.cancel()
+            raise
+        finally:
+            if own_executor:
+                executor.shutdown(wait=True)
+            result = self.finish(completed=completed)
+        return result
 
-        self.counter_lock.release()
+    def finish(self, completed: bool) -> Tuple[int, int]:
+        if self.checkpoint is not None:
+            if completed and not self.ack_blocked and not self.checkpoint.partial:
+                self.checkpoint.complete()
+            else:
+                self.checkpoint.save()
+                print(f"Checkpoint stored to {self.checkpoint.path}")
+        prefix = f"[{self.label}] " if self.label is not None else ""
+        duplicates = f", Skipped existing: {self.duplicates}" if self.op_type == 'create' else ""
+        print(f"{prefix}Indexed: {self.counter - self.failed - self.duplicates} of {self.counter} documents, Failed: {self.failed}{duplicates}")
+        result = (self.counter, self.failed)
+        self.reset()
+        return result
 
-    def index_data(self, data: Iterable[Dict], total_records: int, max_workers: int = 20):
+    def index_data(self, data: Iterable[Dict], total_records: int = None, max_workers: int = 20, max_pending: int = None, read_progress: ReadProgress = None, checkpoint: Checkpoint = None):
         self.total_records = total_records
-        with ThreadPoolExecutor(max_workers=30) as executor:
-            self.start_timer = timeit.default_timer()
-            futures = (executor.submit(self.index_record, x) for x in data)
-            for future in futures:
-                future.add_done_callback(self.progress_callback)
-            try:
-                for c_future in as_completed(futures):
-                    c_future.result()
-            except KeyboardInterrupt:
-                executor.shutdown(wait=False, cancel_futures=True)
-                print("KeyboardInterrup: Exiting")
-            except Exception as e:
-                executor.shutdown(wait=False, cancel_futures=True)
-                print(repr(e))
-        self.reset()
\ No newline at end of file
+        self.read_progress = read_progress
+        self.checkpoint = checkpoint
+        tasks = ((self.index_record, doc, 1) for doc in data)
+        return self.run_bounded(tasks=tasks, max_workers=max_workers, max_pending=max_pending)
+
+    def bulk_index_data(self, data: Iterable[Dict], total_records: int = None, max_workers: int = 4, chunk_size: int = 500, max_chunk_bytes: int = 10 * 1024 * 1024, max_pending: int = None, read_progress: ReadProgress = None, checkpoint: Checkpoint = None, flush_interval: float = None):
+        self.total_records = total_records
+        self.read_progress = read_progress
+        self.checkpoint = checkpoint
+        batches = self.make_batches(data=data, chunk_size=chunk_size, max_chunk_bytes=max_chunk_bytes, flush_interval=flush_interval)
+        tasks = (None if batch is None else (self.index_batch, batch, count) for count, batch in batches)
+        return self.run_bounded(tasks=tasks, max_workers=max_workers, max_pending=max_pending)
@@ -0,0 +1,52 @@
+import pathlib
+import functools
+from typing import Dict, Generator, Iterable, List, Optional
+
+from ftnt_log_parser.analytics.ipinfo_loader import IpInfoIndex, load_db
+
+
+class GeoIpEnricher:
+    """
+    Streaming country/ASN enrichment of parsed records from pre-built IpInfoIndex.
+
+    Results are kept in a bounded LRU cache, firewall logs are dominated by a few hot addresses.
+    For field 'srcip' the added keys are 'src_country', 'src_asn' etc.
+    """
+
+    def __init__(self, index: IpInfoIndex, fields: List[str] = None, cache_size: int = 65536) -> None:
+        self.index = index
+        self.fields = fields if fields is not None else ['srcip', 'dstip']
+        self.prefixes = {field: field.removesuffix('ip') + '_' for field in self.fields}
+        self.columns = {column: index.records[column].to_numpy() for column in index.records.columns}
+        self.lookup = functools.lru_cache(maxsize=cache_size)(self.resolve)
+
+    @property
+    def keys(self) -> List[str]:
+        # Keys added to records
+        return [f"{prefix}{column}" for prefix in self.prefixes.values() for column in self.columns]
+
+    @classmethod
+    def from_path(cls, path: pathlib.Path, **kwargs) -> 'GeoIpEnricher':
+        if path.suffix == '.pkl':
+            index = IpInfoIndex.load(path=path)
+        else:
+            index = load_db(path=path)
+        return cls(index=index, **kwargs)
+
+    def resolve(self, prefix: str, ip: str) -> Optional[Dict[str, str]]:
+        position = self.index.lookup_position(ip)
+        if position < 0:
+            return None
+        return {f"{prefix}{column}": values[position] for column, values in self.columns.items()}
+
+    def enrich(self, entries: Iterable[dict]) -> Generator[Dict, None, None]:
+        lookup = self.lookup
+        prefixes = self.prefixes.items()
+        for entry in entries:
+            for field, prefix in prefixes:
+                ip = entry.get(field)
+                if ip is not None:
+                    info = lookup(prefix, ip)
+                    if info is not None:
+                        entry.update(info)
+            yield entry
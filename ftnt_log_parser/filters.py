@@ -0,0 +1,164 @@
+import re
+import shlex
+import datetime
+from typing import Dict, List, Optional, Tuple
+
+from ftnt_log_parser.timestamps import EPOCH_FIELDS, SOURCE_FIELDS, TimestampParser
+
+
+TERM_PATTERN = re.compile(r"(?P<key>[@\w.-]+)(?P<op>!=|>=|<=|=|~|>|<)(?P<value>.*)", flags=re.DOTALL)
+
+TS_KEY = '@timestamp'
+
+# Time range prefilter on date= values is used only for ranges up to this long
+MAX_PREFILTER_DAYS = 31
+
+
+class LogFilter:
+    """
+    Filter expression over log fields, evaluated in two stages.
+
+    Terms are 'key=value' (comma separated alternatives), 'key!=value', 'key~substring',
+    numeric 'key>N', 'key>=N', 'key<N', 'key<=N' and '@timestamp' bounds with ISO dates
+    ('@timestamp>=2024-05-20T10:00'). Terms are combined with AND, groups of terms with 'or'.
+
+    prefilter() tests raw lines for substrings every matching line must contain, so most
+    lines are rejected without being parsed. match() evaluates the parsed record exactly.
+    """
+
+    def __init__(self, groups: List[List[Tuple[str, str, tuple]]], timezone: datetime.tzinfo = None, prefer_epoch: bool = False) -> None:
+        self.groups = groups
+        self.timezone = timezone
+        self.prefer_epoch = prefer_epoch
+        self.timestamp_parser = TimestampParser(timezone=timezone, prefer_epoch=prefer_epoch, output='epoch')
+        # Per group, tuple of alternatives per term, any alternative of every term has to be in line
+        self.needles = tuple(self.group_needles(group) for group in groups)
+
+    @classmethod
+    def parse(cls, expression: str, timezone: datetime.tzinfo = None, prefer_epoch: bool = False) -> 'LogFilter':
+        try:
+            tokens = shlex.split(expression)
+        except ValueError as e:
+            raise ValueError(f"Invalid filter expression: {e}")
+        parser = TimestampParser(timezone=timezone)
+        groups = [[]]
+        for token in tokens:
+            if token.lower() == 'or':
+                groups.append([])
+                continue
+            m = TERM_PATTERN.fullmatch(token)
+            if m is None:
+                raise ValueError(f"Invalid filter term '{token}', expected key=value, key!=value, key~text or comparison")
+            key, op, value = m.group('key'), m.group('op'), m.group('value')
+            if key == TS_KEY:
+                if op not in ('>', '>=', '<', '<='):
+                    raise ValueError(f"{TS_KEY} supports only >, >=, < and <= comparisons")
+                try:
+                    bound = datetime.datetime.fromisoformat(value)
+                except ValueError:
+                    raise ValueError(f"Invalid {TS_KEY} value '{value}', expected ISO date or datetime")
+                if bound.tzinfo is None:
+                    bound = parser.localize(bound)
+                groups[-1].append((key, op, (bound.timestamp(),)))
+            elif op in ('>', '>=', '<', '<='):
+                try:
+                    groups[-1].append((key, op, (float(value),)))
+                except ValueError:
+                    raise ValueError(f"Invalid number '{value}' in filter term '{token}'")
+            elif op == '=':
+                groups[-1].append((key, op, tuple(value.split(','))))
+            else:
+                groups[-1].append((key, op, (value,)))
+        if not all(groups):
+            raise ValueError("Empty filter expression or empty group around 'or'")
+        return cls(groups=groups, timezone=timezone, prefer_epoch=prefer_epoch)
+
+    def group_needles(self, group: List[Tuple[str, str, tuple]]) -> tuple:
+        needles = []
+        bounds = {}
+        for key, op, values in group:
+            if key == TS_KEY:
+                bounds[op[0]] = values[0]
+            elif op == '=':
+                if any('"' in x or '\\' in x for x in values):
+                    # Escaped in the raw line, only the key is looked for
+                    needles.append((f"{key}=",))
+                else:
+                    needles.append(tuple(y for x in values for y in (f"{key}={x}", f'{key}="{x}"')))
+            elif op == '~':
+                needles.append((f"{key}=",) if '"' in values[0] or '\\' in values[0] else (values[0],))
+            elif op != '!=':
+                needles.append((f"{key}=",))
+        if '>' in bounds and '<' in bounds and not self.prefer_epoch:
+            # date= holds device local date, a day of margin covers any timezone offset
+            first = datetime.datetime.fromtimestamp(bounds['>'], tz=datetime.timezone.utc).date() - datetime.timedelta(days=1)
+            last = datetime.datetime.fromtimestamp(bounds['<'], tz=datetime.timezone.utc).date() + datetime.timedelta(days=1)
+            days = (last - first).days
+            if 0 <= days <= MAX_PREFILTER_DAYS:
+                needles.append(tuple(f"date={first + datetime.timedelta(days=x)}" for x in range(days + 1)))
+        return tuple(needles)
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        # Record keys needed by match()
+        fields = {}
+        ts_fields = SOURCE_FIELDS + EPOCH_FIELDS if self.prefer_epoch else SOURCE_FIELDS
+        for group in self.groups:
+            for key, _, _ in group:
+                fields.update(dict.fromkeys(ts_fields if key == TS_KEY else (key,)))
+        return tuple(fields)
+
+    def prefilter(self, line: str) -> bool:
+        for group in self.needles:
+            for alternatives in group:
+                for needle in alternatives:
+                    if needle in line:
+                        break
+                else:
+                    break
+            else:
+                return True
+        return False
+
+    def timestamp(self, entry: Dict) -> Optional[int]:
+        try:
+            return self.timestamp_parser.parse(entry)
+        except (KeyError, ValueError, TypeError):
+            return None
+
+    def match_term(self, entry: Dict, key: str, op: str, values: tuple) -> bool:
+        if key == TS_KEY:
+            value = self.timestamp(entry)
+            if value is None:
+                return False
+        else:
+            value = entry.get(key)
+            if op == '!=':
+                return value != values[0]
+            if value is None:
+                return False
+            if op == '=':
+                return value in values
+            if op == '~':
+                return values[0] in value
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return False
+        bound = values[0]
+        if op == '>':
+            return value > bound
+        if op == '>=':
+            return value >= bound
+        if op == '<':
+            return value < bound
+        return value <= bound
+
+    def match(self, entry: Dict) -> bool:
+        for group in self.groups:
+            for key, op, values in group:
+                if not self.match_term(entry, key, op, values):
+                    break
+            else:
+                return True
+        return False
@@ -0,0 +1,249 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import pathlib
+import threading
+import collections
+from typing import Generator, List, Optional, Tuple
+
+
+# Bytes from start of file used to recognize it after rotation
+FINGERPRINT_SIZE = 1024
+
+
+def fingerprint(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+class FollowState:
+    """
+    Persisted position of LogFollower, stored next to followed file as '<name>.flpfollow'.
+
+    The file is identified by fingerprint of its first bytes rather than by inode, so the
+    position can be found again in a rotated (renamed or compressed) copy.
+    Implements acknowledge/save/complete like Checkpoint, so ElasticIndexer advances it only
+    over documents confirmed by Elasticsearch.
+    """
+
+    SUFFIX = '.flpfollow'
+
+    def __init__(self, file: pathlib.Path, interval: float = 1.0) -> None:
+        self.file = file
+        self.path = file.with_name(file.name + self.SUFFIX)
+        self.interval = interval
+        self.fingerprint: Optional[str] = None
+        self.fingerprint_size = 0
+        self.offset = 0
+        # A followed file is never read only partially, see Checkpoint.partial
+        self.partial = False
+        self.last_save = 0.0
+        # (lines read so far, fingerprint, fingerprint size, offset after those lines)
+        self.marks = collections.deque()
+        self.lines_read = 0
+        self.lock = threading.Lock()
+
+    def load(self) -> bool:
+        if not self.path.exists():
+            return False
+        try:
+            data = json.loads(self.path.read_text())
+        except json.JSONDecodeError:
+            print(f"Follow state {self.path} is corrupted, ignoring it")
+            return False
+        self.fingerprint = data.get('fingerprint')
+        self.fingerprint_size = data.get('fingerprint_size', 0)
+        self.offset = data.get('offset', 0)
+        return True
+
+    def mark(self, lines: int, fingerprint: str, fingerprint_size: int, offset: int):
+        with self.lock:
+            self.lines_read += lines
+            self.marks.append((self.lines_read, fingerprint, fingerprint_size, offset))
+
+    def skip(self, count: int):
+        # Lines of the last marked batch not turned into documents, marks count documents
+        # so that acknowledged document counts still map to offsets
+        print(f"Skipped {count} lines of {self.file} without date/time")
+        with self.lock:
+            self.lines_read -= count
+            if self.marks:
+                lines, *position = self.marks.pop()
+                self.marks.append((lines - count, *position))
+
+    def acknowledge(self, count: int):
+        # count is the number of documents acknowledged in order since following started
+        with self.lock:
+            advanced = False
+            while self.marks and self.marks[0][0] <= count:
+                _, self.fingerprint, self.fingerprint_size, self.offset = self.marks.popleft()
+                advanced = True
+        if advanced and time.monotonic() - self.last_save >= self.interval:
+            self.save()
+
+    def save(self):
+        data = {'fingerprint': self.fingerprint, 'fingerprint_size': self.fingerprint_size, 'offset': self.offset}
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        try:
+            tmp_path.write_text(json.dumps(data))
+            tmp_path.replace(self.path)
+        except OSError as e:
+            print(f"Failed to store follow state {self.path}: {repr(e)}")
+        self.last_save = time.monotonic()
+
+    def complete(self):
+        # A followed file is never complete
+        self.save()
+
+
+class LogFollower:
+    """
+    Tails growing log file, yielding batches of complete new lines.
+
+    Rotation is detected by inode change (rename, including later compression to .gz) or by
+    the file getting shorter than the read position (copytruncate). The old file is drained
+    through the still open handle before switching to the new one.
+    """
+
+    def __init__(self, file: pathlib.Path, state: FollowState = None, encoding: str = 'utf-8', errors: str = 'replace', poll_interval: float = 0.2, from_end: bool = False, stop_event: threading.Event = None) -> None:
+        self.file = file
+        self.state = state
+        self.encoding = encoding
+        self.errors = errors
+        self.poll_interval = poll_interval
+        self.stop_event = stop_event
+        self.handle = None
+        self.identity: Optional[Tuple[int, int]] = None
+        self.draining = False
+        self.offset = 0
+        self.rest = b''
+        self.fingerprint: Optional[str] = None
+        self.fingerprint_size = 0
+        self.open(from_end=from_end)
+
+    @staticmethod
+    def read_prefix(path: pathlib.Path, size: int) -> bytes:
+        opener = gzip.open if path.suffix == '.gz' else open
+        try:
+            with opener(path, mode='rb') as f:
+                return f.read(size)
+        except (OSError, EOFError):
+            return b''
+
+    def rotated_candidates(self) -> List[pathlib.Path]:
+        # eg. fortigate.log.1, fortigate.log.1.gz, fortigate.log-20240520.gz, newest first
+        candidates = [x for x in self.file.parent.glob(self.file.name + '*') if x != self.file and x.is_file() and not x.name.endswith((FollowState.SUFFIX, '.tmp', '.flpidx', '.flpckpt'))]
+        return sorted(candidates, key=lambda x: x.stat().st_mtime, reverse=True)
+
+    def open_path(self, path: pathlib.Path, offset: int = 0):
+        if self.handle is not None:
+            self.handle.close()
+        if path.suffix == '.gz':
+            self.handle = gzip.open(path, mode='rb')
+            # Compressed files can't seek, skip through decompressed data
+            while offset > 0:
+                skipped = len(self.handle.read(min(offset, 1024 * 1024)))
+                if not skipped:
+                    break
+                offset -= skipped
+            self.offset = self.handle.tell()
+            self.identity = None
+        else:
+            self.handle = path.open(mode='rb')
+            stat = os.fstat(self.handle.fileno())
+            if offset > stat.st_size:
+                print(f"{path} is shorter than stored position, reading from beginning")
+                offset = 0
+            self.handle.seek(offset)
+            self.offset = offset
+            self.identity = (stat.st_dev, stat.st_ino)
+        self.rest = b''
+        self.fingerprint = None
+        self.fingerprint_size = 0
+        self.update_fingerprint()
+
+    def open(self, from_end: bool = False):
+        if self.state is not None and self.state.load() and self.state.fingerprint is not None:
+            size = self.state.fingerprint_size
+            if fingerprint(self.read_prefix(self.file, size)) == self.state.fingerprint:
+                print(f"Resuming {self.file} at offset {self.state.offset}")
+                self.open_path(self.file, offset=self.state.offset)
+                return
+            for candidate in self.rotated_candidates():
+                if fingerprint(self.read_prefix(candidate, size)) == self.state.fingerprint:
+                    print(f"{self.file} was rotated to {candidate}, reading rest of it first")
+                    self.open_path(candidate, offset=self.state.offset)
+                    self.fingerprint, self.fingerprint_size = self.state.fingerprint, size
+                    self.draining = True
+                    return
+            print(f"Previous position in {self.file} not found, reading from beginning")
+        self.open_path(self.file)
+        if from_end:
+            self.handle.seek(0, 2)
+            self.offset = self.handle.tell()
+            self.update_fingerprint()
+
+    def update_fingerprint(self):
+        # Compressed rotated files keep fingerprint taken over from state
+        if self.identity is None or self.fingerprint_size >= FINGERPRINT_SIZE or self.fingerprint_size >= self.offset:
+            return
+        size = min(self.offset, FINGERPRINT_SIZE)
+        self.fingerprint = fingerprint(os.pread(self.handle.fileno(), size, 0))
+        self.fingerprint_size = size
+
+    def rotated(self) -> bool:
+        if self.draining:
+            return True
+        try:
+            stat = self.file.stat()
+        except FileNotFoundError:
+            # Renamed, new file not created yet
+            return False
+        if (stat.st_dev, stat.st_ino) != self.identity:
+            return True
+        if stat.st_size < self.offset:
+            print(f"{self.file} was truncated, reading from beginning")
+            self.open_path(self.file)
+        return False
+
+    def read_available(self, max_bytes: int = 1024 * 1024) -> List[str]:
+        # Returns complete lines written since last call, empty list if there are none
+        data = self.handle.read(max_bytes)
+        if not data:
+            if not self.rotated():
+                return []
+            # Old file will not grow anymore, its unterminated last line is complete too
+            data = self.handle.read()
+            if self.rest or (data and not data.endswith(b'\n')):
+                data += b'\n'
+            lines = self.split(data=data)
+            print(f"Finished rotated file, following new {self.file}")
+            self.draining = False
+            self.open_path(self.file)
+            return lines
+        return self.split(data=data)
+
+    def split(self, data: bytes) -> List[str]:
+        data = self.rest + data
+        last_newline = data.rfind(b'\n')
+        if last_newline == -1:
+            self.rest = data
+            return []
+        self.rest = data[last_newline + 1:]
+        self.offset = self.handle.tell() - len(self.rest)
+        self.update_fingerprint()
+        text = data[:last_newline + 1].decode(encoding=self.encoding, errors=self.errors)
+        if '\r' in text:
+            text = text.replace('\r\n', '\n')
+        return text[:-1].split('\n')
+
+    def batches(self) -> Generator[List[str], None, None]:
+        # Yields lists of new lines, empty lists while waiting, so consumers can flush on time
+        while self.stop_event is None or not self.stop_event.is_set():
+            lines = self.read_available()
+            if lines and self.state is not None:
+                self.state.mark(lines=len(lines), fingerprint=self.fingerprint, fingerprint_size=self.fingerprint_size, offset=self.offset)
+            yield lines
+            if not lines:
+                time.sleep(self.poll_interval)
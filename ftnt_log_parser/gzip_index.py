@@ -0,0 +1,351 @@
+import json
+import zlib
+import bisect
+import pathlib
+import collections
+from concurrent.futures import ProcessPoolExecutor
+from typing import Generator, List, Literal, Optional, Tuple
+
+from ftnt_log_parser.utils import ReadProgress
+
+
+CHUNK_SIZE = 1024 * 1024
+INDEX_SUFFIX = '.flpidx'
+GZIP_MAGIC = b'\x1f\x8b\x08'
+
+
+def decompress_members(raw, offset: int = 0, chunk_size: int = CHUNK_SIZE) -> Generator[Tuple[int, bytes], None, None]:
+    """
+    Decompress (possibly multi-member) gzip stream starting at compressed offset, which must be
+    start of a member. Yields (member_offset, data) so callers know which member data belongs to.
+    """
+    raw.seek(offset)
+    position = offset
+    member_offset = offset
+    decompressor = zlib.decompressobj(wbits=31)
+    while True:
+        buf = raw.read(chunk_size)
+        if not buf:
+            break
+        while buf:
+            data = decompressor.decompress(buf)
+            if data:
+                yield member_offset, data
+            if decompressor.eof:
+                position += len(buf) - len(decompressor.unused_data)
+                buf = decompressor.unused_data
+                # Some writers pad between members with zeros
+                stripped = buf.lstrip(b'\x00')
+                position += len(buf) - len(stripped)
+                buf = stripped
+                decompressor = zlib.decompressobj(wbits=31)
+                member_offset = position
+            else:
+                position += len(buf)
+                buf = b''
+
+
+def find_member_offsets(file: pathlib.Path, chunk_size: int = CHUNK_SIZE) -> List[int]:
+    """
+    Candidate gzip member start offsets, found by scanning compressed bytes for a plausible
+    member header. Compressed data can contain the same bytes, so callers must verify that
+    the previous member really ends at the candidate.
+    """
+    offsets = []
+    position = 0
+    tail = b''
+    with file.open(mode='rb') as raw:
+        while True:
+            buf = raw.read(chunk_size)
+            if not buf:
+                break
+            data = tail + buf
+            base = position - len(tail)
+            start = 0
+            while True:
+                found = data.find(GZIP_MAGIC, start)
+                if found == -1 or found + 10 > len(data):
+                    break
+                flags, xfl, os_byte = data[found + 3], data[found + 8], data[found + 9]
+                if not flags & 0xE0 and xfl in (0, 2, 4) and (os_byte <= 13 or os_byte == 255):
+                    offsets.append(base + found)
+                start = found + 1
+            # Keep enough bytes to recognize a header split between reads
+            tail = data[max(start, len(data) - 9):]
+            position += len(buf)
+    return sorted(set(offsets))
+
+
+def decompress_range(path: str, start: int, end: int) -> Tuple[int, int, bytes]:
+    """
+    Decompress whole gzip members starting at compressed offset start, until a member boundary
+    at or after end is reached. Returns (start, stop, data), stop being the boundary reached.
+    """
+    parts = []
+    position = start
+    decompressor = zlib.decompressobj(wbits=31)
+    in_member = False
+    with open(path, mode='rb') as raw:
+        raw.seek(start)
+        while position < end or in_member:
+            buf = raw.read(CHUNK_SIZE)
+            if not buf:
+                break
+            while buf:
+                if not in_member:
+                    if position >= end:
+                        return start, position, b''.join(parts)
+                    # Some writers pad between members with zeros
+                    stripped = buf.lstrip(b'\x00')
+                    position += len(buf) - len(stripped)
+                    buf = stripped
+                    if not buf:
+                        break
+                    in_member = True
+                parts.append(decompressor.decompress(buf))
+                if decompressor.eof:
+                    position += len(buf) - len(decompressor.unused_data)
+                    buf = decompressor.unused_data
+                    decompressor = zlib.decompressobj(wbits=31)
+                    in_member = False
+                else:
+                    position += len(buf)
+                    buf = b''
+    if in_member:
+        raise EOFError(f"Compressed file {path} ended before the end-of-stream marker was reached")
+    return start, position, b''.join(parts)
+
+
+def plan_ranges(offsets: List[int], start: int, size: int, range_size: int) -> List[Tuple[int, int]]:
+    # Group consecutive members into ranges of at least range_size compressed bytes
+    ranges = []
+    range_start = start
+    for offset in offsets:
+        if offset > range_start and offset - range_start >= range_size:
+            ranges.append((range_start, offset))
+            range_start = offset
+    if range_start < size:
+        ranges.append((range_start, size))
+    return ranges
+
+
+def parallel_decompress(file: pathlib.Path, workers: int = None, range_size: int = 4 * CHUNK_SIZE, progress_raw=None) -> Generator[bytes, None, None]:
+    """
+    Decompress multi-member gzip file in worker processes, yielding data in file order.
+
+    Members are grouped into ranges decompressed independently. A false member candidate is
+    detected when the previous range does not stop exactly at it (or it fails to decompress),
+    in which case ranges are planned again from the last verified boundary without it.
+    Single member files are decompressed sequentially in this process.
+    If progress_raw file object is given, it is seeked to the end of each consumed range.
+    """
+    size = file.stat().st_size
+    offsets = find_member_offsets(file=file)
+    if len(offsets) < 2:
+        # Single member, deflate stream can only be decompressed sequentially
+        with file.open(mode='rb') as raw:
+            for _, data in decompress_members(raw=raw):
+                if progress_raw is not None:
+                    progress_raw.seek(raw.tell())
+                yield data
+        return
+    position = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        max_pending = executor._max_workers * 2
+        while position < size:
+            ranges = collections.deque(plan_ranges(offsets=[x for x in offsets if x > position], start=position, size=size, range_size=range_size))
+            pending = collections.deque()
+            replan = False
+            while ranges or pending:
+                while ranges and len(pending) < max_pending:
+                    range_start, range_end = ranges.popleft()
+                    pending.append((range_start, executor.submit(decompress_range, str(file), range_start, range_end)))
+                range_start, future = pending.popleft()
+                try:
+                    start, stop, data = future.result()
+                except (zlib.error, EOFError):
+                    if range_start == position:
+                        # Range starting at verified boundary is really broken
+                        raise
+                    # Not a member start after all
+                    offsets.remove(range_start)
+                    replan = True
+                    break
+                if start != position:
+                    replan = True
+                    break
+                position = stop
+                if progress_raw is not None:
+                    progress_raw.seek(stop)
+                yield data
+            for _, future in pending:
+                future.cancel()
+            if not replan:
+                break
+
+
+class LogIndex:
+    """
+    Sidecar index of access points into plaintext or gzip log file.
+
+    Each point is (line, offset, skip, position): line number starting at the point, compressed
+    offset of the gzip member containing it (byte offset for plaintext), number of uncompressed
+    bytes to skip from start of that member and uncompressed position in the whole file.
+    Gzip member starts are real seek points, inside a member only the decode and parse
+    work before the point is saved.
+    """
+
+    def __init__(self, points: List[Tuple[int, int, int, int]], size: int, mtime_ns: int, lines: int = None) -> None:
+        self.points = points
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.lines = lines
+
+    @staticmethod
+    def index_path(file: pathlib.Path) -> pathlib.Path:
+        return file.with_name(file.name + INDEX_SUFFIX)
+
+    @classmethod
+    def build(cls, file: pathlib.Path, compression_type: Literal['plain', 'gz'], interval: int = 100000) -> 'LogIndex':
+        stat = file.stat()
+        points = [(0, 0, 0, 0)]
+        line = 0
+        position = 0
+        next_point = interval
+        current_member = 0
+        member_position = 0
+        ends_with_newline = True
+        with file.open(mode='rb') as raw:
+            if compression_type == 'gz':
+                chunks = decompress_members(raw=raw)
+            else:
+                chunks = ((0, chunk) for chunk in iter(lambda: raw.read(CHUNK_SIZE), b''))
+            for member_offset, data in chunks:
+                if member_offset != current_member:
+                    current_member = member_offset
+                    member_position = position
+                    if ends_with_newline and points[-1][0] != line:
+                        points.append((line, member_offset, 0, position))
+                newlines = data.count(b'\n')
+                if line + newlines >= next_point:
+                    last_newline = data.rfind(b'\n')
+                    point_position = position + last_newline + 1
+                    if compression_type == 'gz':
+                        points.append((line + newlines, member_offset, point_position - member_position, point_position))
+                    else:
+                        points.append((line + newlines, point_position, 0, point_position))
+                    next_point = line + newlines + interval
+                line += newlines
+                position += len(data)
+                ends_with_newline = data.endswith(b'\n')
+        if not ends_with_newline:
+            line += 1
+        return cls(points=points, size=stat.st_size, mtime_ns=stat.st_mtime_ns, lines=line)
+
+    @classmethod
+    def load(cls, file: pathlib.Path) -> Optional['LogIndex']:
+        path = cls.index_path(file=file)
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text())
+        stat = file.stat()
+        if data['size'] != stat.st_size or data['mtime_ns'] != stat.st_mtime_ns:
+            print(f"Index {path} is outdated, rebuilding")
+            return None
+        return cls(points=[tuple(x) for x in data['points']], size=data['size'], mtime_ns=data['mtime_ns'], lines=data.get('lines'))
+
+    def save(self, file: pathlib.Path):
+        path = self.index_path(file=file)
+        data = {'size': self.size, 'mtime_ns': self.mtime_ns, 'lines': self.lines, 'points': self.points}
+        try:
+            path.write_text(json.dumps(data))
+        except OSError as e:
+            print(f"Failed to store index {path}: {repr(e)}")
+
+    @classmethod
+    def get(cls, file: pathlib.Path, compression_type: Literal['plain', 'gz'], interval: int = 100000) -> 'LogIndex':
+        index = cls.load(file=file)
+        if index is None:
+            index = cls.build(file=file, compression_type=compression_type, interval=interval)
+            index.save(file=file)
+        return index
+
+    def point_for_line(self, line: int) -> Tuple[int, int, int, int]:
+        return self.points[bisect.bisect_right([x[0] for x in self.points], line) - 1]
+
+    def point_for_position(self, position: int) -> Tuple[int, int, int, int]:
+        return self.points[bisect.bisect_right([x[3] for x in self.points], position) - 1]
+
+
+class IndexedReader:
+    """
+    Reads plaintext or gzip log lines from arbitrary line or uncompressed byte offset using LogIndex.
+    """
+
+    def __init__(self, file: pathlib.Path, compression_type: Literal['plain', 'gz'], encoding: str = 'utf-8', errors: str = 'replace', index: LogIndex = None) -> None:
+        self.file = file
+        self.compression_type = compression_type
+        self.encoding = encoding
+        self.errors = errors
+        self.index = index if index is not None else LogIndex.get(file=file, compression_type=compression_type)
+
+    def iter_data(self, raw, point: Tuple[int, int, int, int]) -> Generator[bytes, None, None]:
+        _, offset, skip, _ = point
+        if self.compression_type == 'gz':
+            chunks = (data for _, data in decompress_members(raw=raw, offset=offset))
+        else:
+            raw.seek(offset)
+            chunks = iter(lambda: raw.read(CHUNK_SIZE), b'')
+        for data in chunks:
+            if skip:
+                if skip >= len(data):
+                    skip -= len(data)
+                    continue
+                data = data[skip:]
+                skip = 0
+            yield data
+
+    def read_lines(self, start_line: int = 0, end_line: int = None, start_position: int = None, progress: ReadProgress = None) -> Generator[str, None, None]:
+        """
+        Yield lines [start_line, end_line). If start_position (uncompressed byte offset) is given,
+        reading starts at first line beginning at or after it instead.
+        """
+        if start_position is not None:
+            point = self.index.point_for_position(start_position)
+            start_line = 0
+        else:
+            point = self.index.point_for_line(start_line)
+            start_position = 0
+        line = point[0]
+        # Uncompressed position of rest, the incomplete line carried over between chunks
+        rest_start = point[3]
+        rest = b''
+        with self.file.open(mode='rb') as raw:
+            if progress is not None:
+                progress.attach(raw, start_position=point[1])
+            for data in self.iter_data(raw=raw, point=point):
+                data = rest + data
+                last_newline = data.rfind(b'\n')
+                if last_newline == -1:
+                    rest = data
+                    continue
+                complete = last_newline + 1
+                rest = data[complete:]
+                if line + data.count(b'\n') <= start_line and rest_start + complete <= start_position:
+                    # Whole chunk is before the requested start, skip without splitting
+                    line += data.count(b'\n')
+                    rest_start += complete
+                    continue
+                line_start = rest_start
+                for raw_line in data[:last_newline].split(b'\n'):
+                    if line >= start_line and line_start >= start_position:
+                        if end_line is not None and line >= end_line:
+                            return
+                        yield raw_line.decode(encoding=self.encoding, errors=self.errors).rstrip('\r')
+                    line += 1
+                    line_start += len(raw_line) + 1
+                rest_start = line_start
+            if rest and line >= start_line and rest_start >= start_position and (end_line is None or line < end_line):
+                yield rest.decode(encoding=self.encoding, errors=self.errors).rstrip('\r')
+        if progress is not None:
+            progress.finished = True
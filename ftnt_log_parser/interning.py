@@ -0,0 +1,126 @@
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+import pandas as pd
+
+from ftnt_log_parser.columnar import CATEGORY_FIELDS
+
+
+class Interner:
+    """
+    Replaces keys, and values of low cardinality fields, with one shared str object each.
+
+    Parsed records otherwise hold a fresh copy of every key and of values like 'accept' or
+    'root' per line. Both tables are bounded by max_size, once full new strings are passed
+    through as they are, strings already in the table are still shared.
+    """
+
+    def __init__(self, value_fields: Set[str] = None, max_size: int = 65536) -> None:
+        self.value_fields = frozenset(value_fields if value_fields is not None else CATEGORY_FIELDS)
+        self.max_size = max_size
+        self.keys: Dict[str, str] = {}
+        self.values: Dict[str, str] = {}
+
+    def intern(self, table: Dict[str, str], text: str) -> str:
+        shared = table.get(text)
+        if shared is not None:
+            return shared
+        if len(table) < self.max_size:
+            table[text] = text
+        return text
+
+    def __call__(self, entry: Dict) -> Dict:
+        keys = self.keys
+        values = self.values
+        value_fields = self.value_fields
+        result = {}
+        for key, value in entry.items():
+            key = keys.get(key) or self.intern(keys, key)
+            if key in value_fields and value.__class__ is str:
+                value = values.get(value) or self.intern(values, value)
+            result[key] = value
+        return result
+
+
+class RecordSchema:
+    # Ordered keys shared by all records with the same keys, typically one per logid
+    __slots__ = ('keys', 'index')
+
+    def __init__(self, keys: Tuple[str, ...]) -> None:
+        self.keys = keys
+        self.index = {key: position for position, key in enumerate(keys)}
+
+
+class CompactRecord(Mapping):
+    """
+    Read-only dict-like record storing only a tuple of values and a reference to its schema.
+    """
+
+    # Values slot is underscored, values() of Mapping has to stay callable
+    __slots__ = ('schema', '_values')
+
+    def __init__(self, schema: RecordSchema, values: tuple) -> None:
+        self.schema = schema
+        self._values = values
+
+    def __getitem__(self, key: str):
+        return self._values[self.schema.index[key]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.schema.keys)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, key) -> bool:
+        return key in self.schema.index
+
+    def get(self, key: str, default=None):
+        position = self.schema.index.get(key)
+        return default if position is None else self._values[position]
+
+    def to_dict(self) -> Dict:
+        return dict(zip(self.schema.keys, self._values))
+
+    def __repr__(self) -> str:
+        return f"CompactRecord({self.to_dict()!r})"
+
+
+class RecordCompactor:
+    """
+    Turns parsed dicts into CompactRecords, schemas are looked up by the tuple of record keys.
+
+    Records of one logid nearly always have the same keys, so a schema per distinct key tuple
+    behaves like a schema per logid without trusting logid alone. At most max_schemas are kept,
+    records with unseen keys beyond that get their own unshared schema.
+    """
+
+    def __init__(self, interner: Interner = None, max_schemas: int = 4096) -> None:
+        self.interner = interner
+        self.max_schemas = max_schemas
+        self.schemas: Dict[Tuple[str, ...], RecordSchema] = {}
+
+    def __call__(self, entry: Dict) -> CompactRecord:
+        if self.interner is not None:
+            entry = self.interner(entry)
+        keys = tuple(entry)
+        schema = self.schemas.get(keys)
+        if schema is None:
+            schema = RecordSchema(keys=keys)
+            if len(self.schemas) < self.max_schemas:
+                self.schemas[keys] = schema
+        return CompactRecord(schema=schema, values=tuple(entry.values()))
+
+
+def compact_records_to_df(records: Iterable[CompactRecord]) -> pd.DataFrame:
+    # Rows are grouped by schema, each group becomes one frame from plain tuples, original order is kept
+    groups: Dict[int, Tuple[RecordSchema, List[int], List[tuple]]] = {}
+    for position, record in enumerate(records):
+        group = groups.get(id(record.schema))
+        if group is None:
+            group = groups[id(record.schema)] = (record.schema, [], [])
+        group[1].append(position)
+        group[2].append(record._values)
+    if not groups:
+        return pd.DataFrame()
+    frames = [pd.DataFrame.from_records(rows, columns=list(schema.keys), index=positions) for schema, positions, rows in groups.values()]
+    return pd.concat(frames, sort=False).sort_index().reset_index(drop=True)
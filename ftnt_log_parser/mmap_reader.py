@@ -0,0 +1,55 @@
+import mmap
+import pathlib
+import contextlib
+from typing import Generator, List, Tuple
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@contextlib.contextmanager
+def open_mmap(file: pathlib.Path):
+    # Empty files cannot be mapped, None is yielded instead
+    with file.open(mode='rb') as raw:
+        if not raw.seek(0, 2):
+            yield None
+            return
+        with mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def split_ranges(file: pathlib.Path, range_size: int = 8 * CHUNK_SIZE) -> List[Tuple[int, int]]:
+    """
+    Split plaintext file into (start, end) byte ranges of about range_size, each ending right
+    after a newline (or at the end of file), so every line belongs to exactly one range.
+    """
+    ranges = []
+    with open_mmap(file=file) as mm:
+        if mm is None:
+            return ranges
+        size = len(mm)
+        start = 0
+        while start < size:
+            end = mm.find(b'\n', min(start + range_size, size) - 1)
+            end = size if end == -1 else end + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def iter_range(mm: mmap.mmap, start: int, end: int, chunk_size: int = CHUNK_SIZE) -> Generator[bytes, None, None]:
+    for position in range(start, end, chunk_size):
+        yield mm[position:min(position + chunk_size, end)]
+
+
+def count_lines(chunks) -> int:
+    # Lines are counted on raw bytes, nothing is decoded or split
+    count = 0
+    last = b''
+    for data in chunks:
+        if data:
+            count += data.count(b'\n')
+            last = data
+    if last and not last.endswith(b'\n'):
+        count += 1
+    return count
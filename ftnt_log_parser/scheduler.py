@@ -0,0 +1,72 @@
+import glob
+import pathlib
+import threading
+import timeit
+import datetime
+from typing import Any, Callable, Dict, Iterable, List
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from ftnt_log_parser.config import LOGGER
+
+
+SUPPORTED_SUFFIXES = ['.txt', '.log', '.gz', '.tgz']
+
+
+def expand_input_path(path_str: str) -> List[pathlib.Path]:
+    # Expand single -i argument, which can be a file, directory or glob pattern
+    path = pathlib.Path(path_str).expanduser()
+    if glob.has_magic(path_str):
+        paths = [pathlib.Path(x) for x in sorted(glob.glob(str(path), recursive=True))]
+    elif path.is_dir():
+        paths = sorted(path.iterdir())
+    else:
+        paths = [path]
+    return [x.resolve() for x in paths if x.is_file() and x.suffix in SUPPORTED_SUFFIXES]
+
+
+class FileScheduler:
+    """
+    Runs a job for each input file, with up to max_files running concurrently.
+
+    Failure of one file is logged and recorded, remaining files are processed regardless.
+    """
+
+    def __init__(self, max_files: int = 1) -> None:
+        self.max_files = max_files
+        self.stop_event = threading.Event()
+        self.results: Dict[pathlib.Path, Any] = {}
+        self.failures: Dict[pathlib.Path, Exception] = {}
+
+    def run_job(self, job: Callable[[pathlib.Path], Any], file: pathlib.Path):
+        if self.stop_event.is_set():
+            return None
+        start = timeit.default_timer()
+        print(f"[{file.name}] Started")
+        result = job(file)
+        print(f"[{file.name}] Finished in {datetime.timedelta(seconds=timeit.default_timer() - start)}")
+        return result
+
+    def run(self, files: Iterable[pathlib.Path], job: Callable[[pathlib.Path], Any]) -> Dict[pathlib.Path, Any]:
+        files = list(files)
+        with ThreadPoolExecutor(max_workers=self.max_files, thread_name_prefix='flp-file') as executor:
+            pending = {executor.submit(self.run_job, job, file): file for file in files}
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        file = pending.pop(future)
+                        try:
+                            self.results[file] = future.result()
+                        except Exception as e:
+                            LOGGER.error(msg=f"Processing {file} failed: {repr(e)}")
+                            print(f"[{file.name}] Failed: {repr(e)}")
+                            self.failures[file] = e
+            except KeyboardInterrupt:
+                print("KeyboardInterrup: Stopping all files")
+                self.stop_event.set()
+                for future in pending:
+                    future.cancel()
+        print(f"Processed {len(self.results)} of {len(files)} files, Failed: {len(self.failures)}")
+        for file, e in self.failures.items():
+            print(f"  {file}: {repr(e)}")
+        return self.results
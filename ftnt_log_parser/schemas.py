@@ -0,0 +1,156 @@
+import ipaddress
+from typing import Dict, List, Literal, Optional, Set, Tuple
+
+
+# Field kinds: 'long' is converted to int, 'ip' to compressed text form, 'enum' values are shared
+# str objects (categories in DataFrames), 'keyword' is left as is. Unknown fields pass through.
+BASE_SCHEMA: Dict[str, str] = {
+    'eventtime': 'long', 'itime': 'long', 'policyid': 'long', 'sessionid': 'long', 'srcport': 'long',
+    'dstport': 'long', 'proto': 'long', 'duration': 'long', 'sentbyte': 'long', 'rcvdbyte': 'long',
+    'sentpkt': 'long', 'rcvdpkt': 'long', 'transport': 'long', 'tranport': 'long', 'appid': 'long',
+    'vwlid': 'long', 'srcserver': 'long', 'dstserver': 'long', 'crscore': 'long', 'craction': 'long',
+    'srcip': 'ip', 'dstip': 'ip', 'transip': 'ip', 'tranip': 'ip',
+    'type': 'enum', 'subtype': 'enum', 'level': 'enum', 'vd': 'enum', 'action': 'enum', 'devname': 'enum',
+    'devid': 'enum', 'logid': 'enum', 'tz': 'enum', 'service': 'enum', 'policytype': 'enum',
+    'trandisp': 'enum', 'srcintf': 'enum', 'dstintf': 'enum', 'srcintfrole': 'enum', 'dstintfrole': 'enum',
+    'srccountry': 'enum', 'dstcountry': 'enum', 'app': 'enum', 'appcat': 'enum', 'apprisk': 'enum',
+    'utmaction': 'enum', 'eventtype': 'enum', 'logdesc': 'enum', 'crlevel': 'enum', 'policyname': 'enum',
+    'poluuid': 'keyword', 'msg': 'keyword', 'user': 'keyword', 'srcmac': 'keyword', 'dstmac': 'keyword',
+}
+
+# Additions per (type, subtype), subtype None applies to the whole type
+TYPE_SCHEMAS: Dict[Tuple[str, Optional[str]], Dict[str, str]] = {
+    ('traffic', None): {
+        'sentdelta': 'long', 'rcvddelta': 'long', 'lanin': 'long', 'lanout': 'long', 'wanin': 'long',
+        'wanout': 'long', 'countapp': 'long', 'countweb': 'long', 'countips': 'long', 'countav': 'long',
+        'countdns': 'long', 'countssl': 'long', 'shapingpolicyid': 'long', 'shaperdroprcvdbyte': 'long',
+        'shaperdropsentbyte': 'long', 'applist': 'enum', 'osname': 'enum', 'devtype': 'enum', 'dstdevtype': 'enum',
+    },
+    ('utm', None): {
+        'hostname': 'keyword', 'url': 'keyword', 'direction': 'enum', 'profile': 'enum', 'reqtype': 'enum',
+    },
+    ('utm', 'webfilter'): {'cat': 'long', 'catdesc': 'enum', 'method': 'enum'},
+    ('utm', 'ips'): {'attackid': 'long', 'severity': 'enum', 'attack': 'keyword', 'ref': 'keyword'},
+    ('utm', 'virus'): {'virusid': 'long', 'filesize': 'long', 'dtype': 'enum', 'virus': 'keyword', 'filename': 'keyword'},
+    ('utm', 'dns'): {'qtypeval': 'long', 'qtype': 'enum', 'qclass': 'enum', 'qname': 'keyword', 'ipaddr': 'keyword'},
+    ('utm', 'app-ctrl'): {'applist': 'enum'},
+    ('utm', 'ssl'): {'certhash': 'keyword', 'eventsubtype': 'enum'},
+    ('event', None): {'status': 'enum', 'reason': 'keyword', 'ui': 'keyword'},
+    ('event', 'system'): {
+        'cpu': 'long', 'mem': 'long', 'disk': 'long', 'totalsession': 'long', 'setuprate': 'long',
+        'disklograte': 'long', 'fazlograte': 'long', 'freediskstorage': 'long', 'sysuptime': 'long',
+    },
+    ('event', 'vpn'): {
+        'remip': 'ip', 'locip': 'ip', 'remport': 'long', 'locport': 'long', 'tunnelid': 'long',
+        'tunnelip': 'ip', 'tunneltype': 'enum', 'vpntunnel': 'enum', 'xauthgroup': 'enum',
+    },
+    ('event', 'user'): {'authproto': 'enum', 'group': 'enum'},
+}
+
+ES_MAPPINGS = {'long': {'type': 'long'}, 'ip': {'type': 'ip'}, 'enum': {'type': 'keyword', 'ignore_above': 1024}, 'keyword': {'type': 'keyword', 'ignore_above': 1024}}
+
+
+def to_ip(value: str) -> str:
+    # IPv4 is already in its shortest form, IPv6 is compressed ('2001:db8:0:0::1' -> '2001:db8::1')
+    if ':' not in value:
+        return value
+    try:
+        return ipaddress.ip_address(value).compressed
+    except ValueError:
+        return value
+
+
+class SchemaRegistry:
+    """
+    Per type/subtype field schemas, used to convert parsed string values during parsing and to
+    generate Elasticsearch index templates and DataFrame column types from the same definitions.
+
+    Schemas are resolved once per (type, subtype) into a dict of converted field -> kind, so
+    converting a record is one lookup per field present. Kinds are dispatched inline instead of
+    calling a function per field, which about halves the conversion time.
+    Records only pass through fields the schema doesn't know.
+    """
+
+    def __init__(self, base: Dict[str, str] = None, schemas: Dict[Tuple[str, Optional[str]], Dict[str, str]] = None, max_values: int = 65536) -> None:
+        self.base = base if base is not None else BASE_SCHEMA
+        self.schemas = schemas if schemas is not None else TYPE_SCHEMAS
+        self.max_values = max_values
+        self.values: Dict[str, str] = {}
+        self.converters: Dict[Tuple[str, str], Dict[str, str]] = {}
+
+    def fields(self, log_type: str = None, subtype: str = None) -> Dict[str, str]:
+        fields = dict(self.base)
+        fields.update(self.schemas.get((log_type, None), {}))
+        fields.update(self.schemas.get((log_type, subtype), {}))
+        return fields
+
+    def to_enum(self, value: str) -> str:
+        shared = self.values.get(value)
+        if shared is not None:
+            return shared
+        if len(self.values) < self.max_values:
+            self.values[value] = value
+        return value
+
+    def compile(self, log_type: str = None, subtype: str = None) -> Dict[str, str]:
+        # keyword fields are left out, they are not converted
+        converters = {field: kind for field, kind in self.fields(log_type=log_type, subtype=subtype).items() if kind != 'keyword'}
+        if len(self.converters) < 1024:
+            self.converters[(log_type, subtype)] = converters
+        return converters
+
+    def convert(self, entry: Dict) -> Dict:
+        key = (entry.get('type'), entry.get('subtype'))
+        converters = self.converters.get(key)
+        if converters is None:
+            converters = self.compile(*key)
+        values = self.values
+        for field, value in entry.items():
+            kind = converters.get(field)
+            if kind is None or value.__class__ is not str:
+                continue
+            if kind == 'enum':
+                entry[field] = values.get(value) or self.to_enum(value)
+            elif kind == 'long':
+                try:
+                    entry[field] = int(value)
+                except ValueError:
+                    # Malformed values stay strings, index templates set ignore_malformed for them
+                    pass
+            else:
+                entry[field] = to_ip(value)
+        return entry
+
+    def all_fields(self) -> Dict[str, str]:
+        # Field kinds over all schemas, a field with different kinds falls back to keyword
+        fields = dict(self.base)
+        for schema in self.schemas.values():
+            for field, kind in schema.items():
+                if fields.setdefault(field, kind) != kind:
+                    fields[field] = 'keyword'
+        return fields
+
+    def numeric_fields(self) -> Set[str]:
+        return {k for k, v in self.all_fields().items() if v == 'long'}
+
+    def category_fields(self) -> Set[str]:
+        return {k for k, v in self.all_fields().items() if v == 'enum'}
+
+    def index_template(self, index_patterns: List[str], priority: int = 200, timestamp_format: Literal['datetime', 'epoch', 'epoch_millis'] = 'datetime') -> dict:
+        date_format = {'datetime': 'strict_date_optional_time', 'epoch': 'epoch_second', 'epoch_millis': 'epoch_millis'}[timestamp_format]
+        properties = {'@timestamp': {'type': 'date', 'format': date_format}}
+        for field, kind in sorted(self.all_fields().items()):
+            properties[field] = dict(ES_MAPPINGS[kind])
+        return {
+            'index_patterns': index_patterns,
+            'priority': priority,
+            'template': {
+                # Values left as strings by convert() don't reject the whole document
+                'settings': {'index.mapping.ignore_malformed': True},
+                'mappings': {
+                    # Unknown fields are strings, mapped as keyword instead of text + keyword
+                    'dynamic_templates': [{'strings_as_keyword': {'match_mapping_type': 'string', 'mapping': {'type': 'keyword', 'ignore_above': 1024}}}],
+                    'properties': properties,
+                },
+            },
+        }
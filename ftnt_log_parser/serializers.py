@@ -0,0 +1,125 @@
+import io
+import os
+import sys
+import csv
+import json
+import datetime
+from typing import BinaryIO, Dict, Generator, Iterable, List, Literal
+
+from ftnt_log_parser.elasticsearch_indexer import json_default
+
+
+OUTPUT_FORMATS = ['json', 'ndjson', 'json-pretty', 'csv', 'bulk']
+
+NDJSON_ENCODER = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False, default=json_default)
+PRETTY_ENCODER = json.JSONEncoder(indent=2, ensure_ascii=False, default=json_default)
+
+
+def batched(entries: Iterable, size: int) -> Generator[List, None, None]:
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class TimestampFormatter:
+    """
+    Replaces datetime under ts_key with its ISO string before encoding, so the encoder never
+    falls back to default callback. Consecutive records mostly share the same second, the
+    last formatted value is reused for them.
+    """
+
+    def __init__(self, ts_key: str = '@timestamp') -> None:
+        self.ts_key = ts_key
+        self.last_value = None
+        self.last_text = None
+
+    def __call__(self, entry: Dict) -> Dict:
+        value = entry.get(self.ts_key)
+        if isinstance(value, datetime.datetime):
+            last = self.last_value
+            # Aware datetimes compare by instant, the offset decides the text too
+            if value is not last and (value != last or value.utcoffset() != last.utcoffset()):
+                self.last_value = value
+                self.last_text = value.isoformat()
+            entry[self.ts_key] = self.last_text
+        return entry
+
+
+def encode(text: str) -> bytes:
+    # surrogateescape keeps undecodable input bytes as they were
+    return text.encode('utf-8', errors='surrogateescape')
+
+
+def serialize(entries: Iterable[Dict], format: Literal['json', 'ndjson', 'json-pretty', 'csv', 'bulk'] = 'json', batch_size: int = 1000, index_name: str = None, fields: List[str] = None) -> Generator[bytes, None, None]:
+    """
+    Encodes records in batches, yielding one bytes chunk per batch.
+
+    json and ndjson are one compact object per line, bulk is Elasticsearch _bulk body with index
+    actions. csv header is given by fields, or by keys seen in the first batch otherwise,
+    keys appearing only later are left out.
+    """
+    batches = batched(map(TimestampFormatter(), entries), size=batch_size)
+    if format in ('json', 'ndjson'):
+        encoder = NDJSON_ENCODER.encode
+        for batch in batches:
+            yield encode('\n'.join([encoder(x) for x in batch]) + '\n')
+    elif format == 'json-pretty':
+        encoder = PRETTY_ENCODER.encode
+        for batch in batches:
+            yield encode('\n'.join([encoder(x) for x in batch]) + '\n')
+    elif format == 'bulk':
+        encoder = NDJSON_ENCODER.encode
+        action = encoder({"index": {"_index": index_name} if index_name is not None else {}})
+        for batch in batches:
+            yield encode(''.join([f"{action}\n{encoder(x)}\n" for x in batch]))
+    elif format == 'csv':
+        buffer = io.StringIO()
+        writer = None
+        for batch in batches:
+            if writer is None:
+                if fields is None:
+                    fields = list(dict.fromkeys(key for entry in batch for key in entry))
+                writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore', lineterminator='\n')
+                writer.writeheader()
+            writer.writerows(batch)
+            yield encode(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+    else:
+        raise ValueError(f"Unknown output format {format}, expected one of {OUTPUT_FORMATS}")
+
+
+def serialize_lines(lines: Iterable[str], batch_size: int = 1000) -> Generator[bytes, None, None]:
+    for batch in batched(lines, size=batch_size):
+        yield encode('\n'.join(batch) + '\n')
+
+
+def write_output(chunks: Iterable[bytes], stream: BinaryIO = None, buffer_size: int = 1024 * 1024) -> int:
+    # Large buffered writes, to stdout by default, returns number of bytes written
+    owned = stream is None
+    if owned:
+        # Text written through sys.stdout so far goes first
+        sys.stdout.flush()
+        stream = open(os.dup(sys.stdout.fileno()), mode='wb', buffering=buffer_size)
+    written = 0
+    try:
+        for chunk in chunks:
+            stream.write(chunk)
+            written += len(chunk)
+        stream.flush()
+    except BrokenPipeError:
+        # Reader went away (eg. piped to head), not an error. Remaining output is discarded,
+        # otherwise Python complains about stdout again on exit
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, stream.fileno())
+        os.dup2(devnull, sys.stdout.fileno())
+        os.close(devnull)
+    finally:
+        if owned:
+            stream.close()
+    return written
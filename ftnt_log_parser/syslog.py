@@ -0,0 +1,289 @@
+import re
+import time
+import queue
+import socket
+import asyncio
+import threading
+from typing import Generator, Iterable, List, Optional, Tuple
+
+
+RFC3164_TIMESTAMP = re.compile(r"[A-Z][a-z]{2} [ \d]\d \d{2}:\d{2}:\d{2} ")
+
+
+def strip_syslog_header(message: str) -> str:
+    """
+    Returns MSG part of RFC 5424 or RFC 3164 syslog message. FortiOS default format is
+    '<PRI>' directly followed by key=value pairs, in which case only PRI is removed.
+    """
+    if message.startswith('<'):
+        end = message.find('>', 1, 5)
+        if end != -1:
+            message = message[end + 1:]
+    if message.startswith('1 '):
+        # VERSION TIMESTAMP HOSTNAME APP-NAME PROCID MSGID STRUCTURED-DATA MSG
+        parts = message.split(' ', 6)
+        if len(parts) < 7:
+            return ''
+        rest = parts[6]
+        if rest.startswith('-'):
+            rest = rest[2:]
+        else:
+            # Skip SD-ELEMENTs, ']' inside PARAM-VALUE is escaped as '\]'
+            position = 0
+            while position < len(rest) and rest[position] == '[':
+                position += 1
+                while position < len(rest) and rest[position] != ']':
+                    position += 2 if rest[position] == '\\' else 1
+                position += 1
+            rest = rest[position + 1:]
+        return rest[1:] if rest.startswith('\ufeff') else rest
+    if RFC3164_TIMESTAMP.match(message):
+        # TIMESTAMP HOSTNAME [TAG:] MSG
+        parts = message[16:].split(' ', 2)
+        if len(parts) == 3 and parts[1].endswith(':'):
+            return parts[2]
+        return ' '.join(parts[1:])
+    return message
+
+
+def udp_kernel_drops(port: int) -> Optional[int]:
+    # Datagrams dropped by the kernel for socket bound to port, Linux only
+    drops = None
+    for path in ('/proc/net/udp', '/proc/net/udp6'):
+        try:
+            with open(path) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if int(fields[1].rsplit(':', 1)[1], 16) == port:
+                        drops = (drops or 0) + int(fields[-1])
+        except (OSError, ValueError, IndexError):
+            continue
+    return drops
+
+
+class SyslogUdpProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, receiver: 'SyslogReceiver') -> None:
+        self.receiver = receiver
+
+    def datagram_received(self, data: bytes, addr):
+        self.receiver.add(data=data, tcp=False)
+
+
+class SyslogReceiver:
+    """
+    Asyncio syslog server for UDP and TCP (octet counting or newline framing, RFC 6587).
+
+    The server runs its own event loop in a background thread. Messages are collected into
+    batches handed over to consumer thread through bounded queue. When the queue is full, UDP
+    batches are dropped and counted, TCP connections stop reading until there is space.
+    UDP and TCP messages are collected into separate batches, so TCP messages are never dropped.
+    """
+
+    def __init__(self, udp: Tuple[str, int] = None, tcp: Tuple[str, int] = None, batch_size: int = 1000, flush_interval: float = 0.2, max_queue: int = 1000, receive_buffer: int = 8 * 1024 * 1024, encoding: str = 'utf-8', errors: str = 'replace', report_interval: float = 10.0) -> None:
+        self.udp = udp
+        self.tcp = tcp
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.receive_buffer = receive_buffer
+        self.encoding = encoding
+        self.errors = errors
+        self.report_interval = report_interval
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.batch: List[bytes] = []
+        self.tcp_batch: List[bytes] = []
+        self.received = 0
+        self.received_bytes = 0
+        self.dropped = 0
+        # Messages the consumer could not parse, see add_invalid
+        self.invalid = 0
+        self.connections = 0
+        self.udp_port = None
+        self.tcp_port = None
+        self.loop: asyncio.AbstractEventLoop = None
+        self.stopped: asyncio.Future = None
+        self.thread: threading.Thread = None
+        self.ready = threading.Event()
+        self.error: Exception = None
+        self.start_time = None
+
+    def add(self, data: bytes, tcp: bool = False):
+        # Kept as bytes, decoding is left to the consumer so the event loop only receives
+        self.received += 1
+        self.received_bytes += len(data)
+        batch = self.tcp_batch if tcp else self.batch
+        batch.append(data)
+        if len(batch) >= self.batch_size:
+            self.handoff(tcp=tcp)
+
+    def add_invalid(self, count: int):
+        # Called from consumer thread, reported with the receive counters
+        self.invalid += count
+
+    def decode(self, batch: List[bytes]) -> List[str]:
+        return [strip_syslog_header(x.rstrip(b'\r\n\x00').decode(encoding=self.encoding, errors=self.errors)) for x in batch]
+
+    def handoff(self, tcp: bool = False) -> bool:
+        batch = self.tcp_batch if tcp else self.batch
+        if not len(batch):
+            return True
+        try:
+            self.queue.put_nowait(batch)
+        except queue.Full:
+            if tcp:
+                # TCP batch is kept, connections stop reading until there is space
+                return False
+            self.dropped += len(batch)
+        if tcp:
+            self.tcp_batch = []
+        else:
+            self.batch = []
+        return True
+
+    async def handle_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                first = await reader.read(1)
+                if not first:
+                    break
+                if first in (b'\n', b'\r'):
+                    # Empty line between newline framed messages
+                    continue
+                if first.isdigit():
+                    # Octet counting: MSG-LEN SP SYSLOG-MSG
+                    length = int(first + (await reader.readuntil(b' '))[:-1])
+                    data = await reader.readexactly(length)
+                else:
+                    data = first + await reader.readuntil(b'\n')
+                self.add(data=data, tcp=True)
+                while self.queue.full():
+                    await asyncio.sleep(0.01)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError) as e:
+            if not isinstance(e, asyncio.IncompleteReadError) or e.partial:
+                print(f"Syslog TCP connection error: {repr(e)}")
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def make_udp_socket(self) -> socket.socket:
+        family = socket.AF_INET6 if ':' in self.udp[0] else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(self.udp)
+        actual = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        if actual < self.receive_buffer:
+            print(f"UDP receive buffer limited to {actual} bytes, raise net.core.rmem_max to avoid drops")
+        return sock
+
+    def report(self):
+        elapsed = time.monotonic() - self.start_time
+        kernel_drops = udp_kernel_drops(port=self.udp_port) if self.udp_port is not None else None
+        kernel = f", kernel dropped: {kernel_drops}" if kernel_drops is not None else ""
+        print(f"Syslog received: {self.received} ({self.received / elapsed:.0f}/s, {self.received_bytes / elapsed / 2**20:.2f} MiB/s), Dropped: {self.dropped}{kernel}, Unparseable: {self.invalid}, Queue depth: {self.queue.qsize()} batches, TCP connections: {self.connections}")
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = self.loop.create_future()
+        transport = server = None
+        if self.udp is not None:
+            transport, _ = await self.loop.create_datagram_endpoint(lambda: SyslogUdpProtocol(receiver=self), sock=self.make_udp_socket())
+            self.udp_port = transport.get_extra_info('sockname')[1]
+            print(f"Listening for syslog on udp/{self.udp_port}")
+        if self.tcp is not None:
+            server = await asyncio.start_server(self.handle_tcp, host=self.tcp[0], port=self.tcp[1], limit=1024 * 1024)
+            self.tcp_port = server.sockets[0].getsockname()[1]
+            print(f"Listening for syslog on tcp/{self.tcp_port}")
+        self.start_time = time.monotonic()
+        self.ready.set()
+        next_report = self.start_time + self.report_interval
+        while not self.stopped.done():
+            await asyncio.wait([self.stopped], timeout=self.flush_interval)
+            self.handoff(tcp=False)
+            self.handoff(tcp=True)
+            if time.monotonic() >= next_report:
+                next_report += self.report_interval
+                self.report()
+        if transport is not None:
+            transport.close()
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        for batch in (self.batch, self.tcp_batch):
+            if len(batch):
+                try:
+                    self.queue.put_nowait(batch)
+                except queue.Full:
+                    self.dropped += len(batch)
+        self.batch = []
+        self.tcp_batch = []
+        self.report()
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except Exception as e:
+            self.error = e
+        finally:
+            self.ready.set()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='flp-syslog', daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+
+    def stop(self):
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(lambda: self.stopped.done() or self.stopped.set_result(None))
+        self.thread.join()
+
+    def batches(self, stop_event: threading.Event = None, poll_interval: float = 0.2) -> Generator[List[str], None, None]:
+        # Yields received batches, empty lists while idle, so consumers can flush on time
+        while stop_event is None or not stop_event.is_set():
+            try:
+                yield self.decode(self.queue.get(timeout=poll_interval))
+            except queue.Empty:
+                yield []
+        self.stop()
+        while not self.queue.empty():
+            yield self.decode(self.queue.get_nowait())
+
+
+def replay(lines: Iterable[str], host: str = '127.0.0.1', port: int = 514, protocol: str = 'udp', rate: float = None, framing: str = 'octet', pri: int = 189) -> Tuple[int, float]:
+    """
+    Sends lines as syslog messages at rate messages per second (as fast as possible when None).
+    Lines without PRI get '<pri>' prepended. Returns (sent, elapsed seconds).
+    """
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_DGRAM if protocol == 'udp' else socket.SOCK_STREAM)
+    if protocol == 'tcp':
+        sock.connect((host, port))
+    prefix = f"<{pri}>".encode('utf-8')
+    sent = 0
+    frames = []
+    start = time.monotonic()
+    for line in lines:
+        data = line.encode('utf-8')
+        if not data.startswith(b'<'):
+            data = prefix + data
+        if protocol == 'udp':
+            sock.sendto(data, (host, port))
+        else:
+            frames.append(f"{len(data)} ".encode('utf-8') + data if framing == 'octet' else data + b'\n')
+            if len(frames) >= 100:
+                sock.sendall(b''.join(frames))
+                frames = []
+        sent += 1
+        if rate is not None and sent % 100 == 0:
+            # Sleep in steps of 100 messages, finer sleeps are not accurate anyway
+            delay = start + sent / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+    if frames:
+        sock.sendall(b''.join(frames))
+    sock.close()
+    return sent, time.monotonic() - start
@@ -0,0 +1,102 @@
+import datetime
+from typing import Dict, Literal, Union
+
+
+# Record keys timestamps are built from, epoch ones only with prefer_epoch
+SOURCE_FIELDS = ('date', 'time', 'tz')
+EPOCH_FIELDS = ('eventtime', 'itime')
+
+
+class TimestampParser:
+    """
+    Builds record timestamps from FortiOS date/time/tz fields.
+
+    Parsed timezones and the start of each (date, hour, tz) are cached, since the same values
+    repeat on thousands of consecutive lines, and only minutes and seconds are parsed per record.
+    """
+
+    def __init__(self, timezone: datetime.tzinfo = None, prefer_epoch: bool = False, output: Literal['datetime', 'epoch', 'epoch_millis'] = 'datetime', cache_size: int = 4096) -> None:
+        self.timezone = timezone if timezone is not None else datetime.timezone.utc
+        self.prefer_epoch = prefer_epoch
+        self.output = output
+        self.cache_size = cache_size
+        self._tz_cache: Dict[str, datetime.tzinfo] = {}
+        self._hour_cache: Dict[tuple, tuple] = {}
+        self._last_key = None
+        self._last_value = None
+
+    def get_tzinfo(self, tz: str) -> datetime.tzinfo:
+        tzinfo = self._tz_cache.get(tz)
+        if tzinfo is None:
+            tzinfo = datetime.datetime.strptime(tz, '%z').tzinfo
+            self._tz_cache[tz] = tzinfo
+        return tzinfo
+
+    def localize(self, naive: datetime.datetime) -> datetime.datetime:
+        if hasattr(self.timezone, 'localize'):
+            # pytz timezones need localize() to pick correct DST offset
+            return self.timezone.localize(naive)
+        return naive.replace(tzinfo=self.timezone)
+
+    def hour_start(self, date: str, hour: str, tz: str = None):
+        key = (date, hour, tz)
+        value = self._hour_cache.get(key)
+        if value is None:
+            if len(self._hour_cache) >= self.cache_size:
+                self._hour_cache.clear()
+            naive = datetime.datetime(int(date[0:4]), int(date[5:7]), int(date[8:10]), int(hour))
+            if tz is not None:
+                start = naive.replace(tzinfo=self.get_tzinfo(tz))
+            else:
+                start = self.localize(naive)
+            value = (start, int(start.timestamp()))
+            self._hour_cache[key] = value
+        return value
+
+    def convert(self, start: datetime.datetime, start_epoch: int, seconds: int) -> Union[datetime.datetime, int]:
+        if self.output == 'epoch':
+            return start_epoch + seconds
+        elif self.output == 'epoch_millis':
+            return (start_epoch + seconds) * 1000
+        return start + datetime.timedelta(seconds=seconds)
+
+    def from_epoch(self, value: str, tz: str = None) -> Union[datetime.datetime, int]:
+        # eventtime is in s, ms, us or ns depending on FortiOS version, itime in s
+        digits = len(value)
+        if digits >= 19:
+            seconds = int(value) / 1e9
+        elif digits >= 16:
+            seconds = int(value) / 1e6
+        elif digits >= 13:
+            seconds = int(value) / 1e3
+        else:
+            seconds = int(value)
+        if self.output == 'epoch':
+            return int(seconds)
+        elif self.output == 'epoch_millis':
+            return int(seconds * 1000)
+        tzinfo = self.get_tzinfo(tz) if tz is not None else self.timezone
+        return datetime.datetime.fromtimestamp(seconds, tz=tzinfo)
+
+    def parse(self, entry: dict) -> Union[datetime.datetime, int]:
+        tz = entry.get('tz')
+        if self.prefer_epoch:
+            epoch = entry.get('eventtime') or entry.get('itime')
+            if epoch is not None and str(epoch).isdigit():
+                return self.from_epoch(value=str(epoch), tz=tz)
+        date = entry['date']
+        time = entry['time']
+        key = (date, time, tz)
+        if key == self._last_key:
+            return self._last_value
+        if len(time) == 8:
+            start, start_epoch = self.hour_start(date=date, hour=time[0:2], tz=tz)
+            value = self.convert(start=start, start_epoch=start_epoch, seconds=int(time[3:5]) * 60 + int(time[6:8]))
+        else:
+            # Not zero padded, fall back to strptime
+            naive = datetime.datetime.strptime(f"{date}_{time}", "%Y-%m-%d_%H:%M:%S")
+            start, start_epoch = self.hour_start(date=naive.strftime('%Y-%m-%d'), hour=str(naive.hour), tz=tz)
+            value = self.convert(start=start, start_epoch=start_epoch, seconds=naive.minute * 60 + naive.second)
+        self._last_key = key
+        self._last_value = value
+        return value
@@ -0,0 +1,101 @@
+import re
+from typing import Dict, Iterable, Generator, Tuple
+
+
+# Used only for lines containing escaped quotes, which the fast path cannot split on
+ESCAPED_KV_PATTERN = re.compile(pattern=r'(?:^|(?<=\s))([\w-]+)=(?:"([^"\\]*(?:\\.[^"\\]*)*)"|(\S*))')
+
+# Unquoted values end at any whitespace, same as str.split() in parse_line
+WHITESPACE_PATTERN = re.compile(pattern=r'\s')
+
+
+def _unescape(value: str) -> str:
+    return value.replace('\\\\', '\x00').replace('\\"', '"').replace('\x00', '\\')
+
+
+def parse_escaped_line(line: str) -> Dict[str, str]:
+    if line.startswith('<'):
+        line = line[line.find('>') + 1:]
+    data = {}
+    for key, quoted, plain in ESCAPED_KV_PATTERN.findall(line):
+        if '\\' in quoted:
+            quoted = _unescape(quoted)
+        data[key] = quoted or plain
+    return data
+
+
+def parse_line(line: str) -> Dict[str, str]:
+    """
+    Parse single FortiOS log line in key=value format into dict.
+
+    Quoted values keep spaces, '=' and escaped quotes. Words without '=' (such as
+    syslog header fields) are skipped.
+    """
+    if '\\"' in line:
+        return parse_escaped_line(line)
+    if line.startswith('<'):
+        # Syslog priority glued to the first key, eg. '<189>date=...'
+        line = line[line.find('>') + 1:]
+    data = {}
+    key = None
+    quoted = False
+    # Splitting on quotes puts every quoted value at an odd index, with the key
+    # as the last word of the preceding part
+    for part in line.split('"'):
+        if quoted:
+            data[key] = part
+        else:
+            for word in part.split():
+                key, sep, value = word.partition('=')
+                if sep:
+                    data[key] = value
+        quoted = not quoted
+    return data
+
+
+def parse_fields(line: str, fields: Tuple[str, ...]) -> Dict[str, str]:
+    """
+    Parse only given keys of single FortiOS log line, other values are never sliced out.
+
+    Each key is looked up directly as 'key=' preceded by whitespace, outside of quoted values
+    (even number of quotes before it). The last occurrence wins, same as in parse_line.
+    """
+    if '\\"' in line:
+        data = parse_escaped_line(line)
+        return {key: data[key] for key in fields if key in data}
+    if line.startswith('<'):
+        line = line[line.find('>') + 1:]
+    data = {}
+    for key in fields:
+        needle = key + '='
+        end = len(line)
+        while True:
+            position = line.rfind(needle, 0, end)
+            if position == -1:
+                break
+            if (position == 0 or line[position - 1].isspace()) and not line.count('"', 0, position) % 2:
+                start = position + len(needle)
+                if line.startswith('"', start):
+                    stop = line.find('"', start + 1)
+                    data[key] = line[start + 1:] if stop == -1 else line[start + 1:stop]
+                else:
+                    stop = line.find(' ', start)
+                    value = line[start:] if stop == -1 else line[start:stop]
+                    if not value.isprintable():
+                        # Other whitespace (tab, newline) is never printable
+                        match = WHITESPACE_PATTERN.search(value)
+                        if match is not None:
+                            value = value[:match.start()]
+                    data[key] = value
+                break
+            end = position + len(needle) - 1
+    return data
+
+
+def parse_lines(lines: Iterable[str], fields: Tuple[str, ...] = None) -> Generator[Dict[str, str], None, None]:
+    if fields is not None:
+        for line in lines:
+            yield parse_fields(line, fields)
+        return
+    for line in lines:
+        yield parse_line(line)
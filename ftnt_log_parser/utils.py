@@ -1,3 +1,5 @@
+import os
+import pathlib
 import collections.abc
 
 # https://stackoverflow.com/a/3233356
@@ -21,3 +23,72 @@ def dict_update_path(orig, path, value, inplace: bool = False):
     return ret
 
 
+
+def copy_template(template: dict) -> dict:
+    # Copy only the dict levels, leaf values are shared
+    copy = template.copy()
+    for k, v in template.items():
+        if isinstance(v, dict):
+            copy[k] = copy_template(v)
+    return copy
+
+def merge_template(target: dict, template: dict) -> dict:
+    # In place counterpart of recursive_dict_update for precompiled templates
+    for k, v in template.items():
+        if isinstance(v, dict):
+            existing = target.get(k)
+            if isinstance(existing, dict):
+                merge_template(target=existing, template=v)
+            else:
+                target[k] = copy_template(v)
+        else:
+            target[k] = v
+    return target
+
+def compile_template(paths: dict):
+    # Turn {"a.b": 1, "c": 2} into nested template, split into flat and nested part
+    # so that flat keys can be applied with single dict.update()
+    template = {}
+    for path, value in paths.items():
+        dict_update_path(orig=template, path=path, value=value, inplace=True)
+    flat = {k: v for k, v in template.items() if not isinstance(v, dict)}
+    nested = {k: v for k, v in template.items() if isinstance(v, dict)}
+    return flat, nested
+
+
+class ReadProgress:
+    # Tracks how far into the (possibly compressed) file a reader is, based on bytes
+    # consumed from the underlying file object, so no pre-scan is needed for ETA
+
+    def __init__(self, path: pathlib.Path = None) -> None:
+        self.total_bytes = path.stat().st_size if path is not None else 0
+        self.fileobj = None
+        self.finished = False
+        # Offset reading started at when resuming in the middle of a file
+        self.start_position = 0
+
+    def attach(self, fileobj, start_position: int = 0) -> None:
+        self.fileobj = fileobj
+        self.finished = False
+        self.start_position = start_position
+        if not self.total_bytes:
+            self.total_bytes = os.fstat(fileobj.fileno()).st_size
+
+    @property
+    def position(self) -> int:
+        if self.finished:
+            return self.total_bytes
+        if self.fileobj is None:
+            return 0
+        try:
+            return self.fileobj.tell()
+        except ValueError:
+            # File already closed
+            return self.total_bytes
+
+    @property
+    def fraction(self) -> float:
+        remaining = self.total_bytes - self.start_position
+        if remaining <= 0:
+            return 0.0
+        return min(max(self.position - self.start_position, 0) / remaining, 1.0)
@@ -17,6 +17,9 @@ setup(
     author="Miroslav Hudec <http://github.com/mihudec>",
     description="FortiNet Log Parser",
     install_requires=load_requirements(),
+    extras_require={
+        'async': ['aiohttp>=3,<4']
+    },
     include_package_data=True,
     entry_points = {
         'console_scripts': [
@@ -0,0 +1,52 @@
+import argparse
+import json
+
+from ftnt_log_parser.checkpoint import Checkpoint
+from ftnt_log_parser.cli import Cli
+from ftnt_log_parser.config import CONFIG
+from ftnt_log_parser.elasticsearch_indexer import ElasticIndexer
+
+
+class BulkClient:
+
+    def __init__(self) -> None:
+        self.documents = []
+
+    def bulk(self, operations: bytes, index: str, pipeline: str = None):
+        lines = operations.decode('utf-8').splitlines()
+        self.documents.extend(json.loads(x) for x in lines[1::2])
+        return {'errors': False, 'items': []}
+
+
+def index_file(path, client: BulkClient, head: int = None):
+    cli = Cli.__new__(Cli)
+    cli.CONFIG = CONFIG
+    args = argparse.Namespace(
+        start_line=0, checkpoint=True, elasticsearch_index='test', count_records=False, log_filter=None,
+        decompress_workers=None, head=head, prefer_epoch=False, timestamp_format='epoch', workers=None,
+        ordered=True, fields=None, schema=False, bulk=True, chunk_size=3, max_chunk_bytes=1024 * 1024, max_pending=None
+    )
+    indexer = ElasticIndexer(client=client, index_name='test', id_mode='fields')
+    cli.index_file(input_file=path, indexer=indexer, args=args, max_workers=1)
+
+
+def test_checkpoint_with_head_resumes(tmp_path):
+    path = tmp_path / 'fw.log'
+    path.write_text(''.join(f'date=2024-05-20 time=10:00:{x:02d} devid="FG1" eventtime={x} sessionid={x} logid="13"\n' for x in range(10)))
+    client = BulkClient()
+
+    index_file(path=path, client=client, head=4)
+    checkpoint = Checkpoint(file=path, index_name='test')
+    assert checkpoint.load() == 4
+    assert not checkpoint.completed
+
+    index_file(path=path, client=client, head=4)
+    index_file(path=path, client=client)
+    assert [x['sessionid'] for x in client.documents] == [str(x) for x in range(10)]
+    checkpoint = Checkpoint(file=path, index_name='test')
+    assert checkpoint.load() == 10
+    assert checkpoint.completed
+
+    # Completed file is skipped
+    index_file(path=path, client=client)
+    assert len(client.documents) == 10
@@ -0,0 +1,39 @@
+import json
+import threading
+import time
+
+import pytest
+
+from ftnt_log_parser.cli import Cli
+from ftnt_log_parser.config import CONFIG
+from ftnt_log_parser.elasticsearch_indexer import ElasticIndexer
+from ftnt_log_parser.follow import FollowState, LogFollower
+
+from test_checkpoint import BulkClient
+
+
+@pytest.mark.parametrize('indexer_stops', [False, True])
+def test_stopped_follow_job_saves_state(tmp_path, indexer_stops):
+    path = tmp_path / 'fw.log'
+    path.write_text(''.join(f'date=2024-05-20 time=10:00:{x:02d} devid="FG1" sessionid={x}\n' for x in range(5)))
+    stop_event = threading.Event()
+    # Only the final save stores the state, periodic saves are not due
+    state = FollowState(file=path, interval=3600)
+    state.last_save = time.monotonic()
+    follower = LogFollower(file=path, state=state, poll_interval=0.01, stop_event=stop_event)
+    client = BulkClient()
+    indexer = ElasticIndexer(client=client, index_name='test', stop_event=stop_event if indexer_stops else None)
+    cli = Cli.__new__(Cli)
+    cli.CONFIG = CONFIG
+    documents = cli.batch_documents(batches=follower.batches(), timestamp_options={}, on_invalid=state.skip)
+    job = threading.Thread(target=indexer.bulk_index_data, kwargs=dict(data=documents, max_workers=1, checkpoint=state, flush_interval=0.01))
+    job.start()
+    deadline = time.monotonic() + 5
+    while len(client.documents) < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stop_event.set()
+    job.join(timeout=5)
+
+    assert len(client.documents) == 5
+    stored = json.loads(state.path.read_text())
+    assert stored['offset'] == path.stat().st_size
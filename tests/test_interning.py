@@ -0,0 +1,32 @@
+from ftnt_log_parser.common import LogLoader
+from ftnt_log_parser.interning import CompactRecord, Interner, RecordCompactor, compact_records_to_df
+
+LINES = [
+    'date=2024-05-20 time=10:00:00 type="traffic" action="deny" srcip=10.0.0.1 dstport=443',
+    'date=2024-05-20 time=10:00:01 type="traffic" action="accept" srcip=10.0.0.2 dstport=80',
+    'date=2024-05-20 time=10:00:02 type="event" logdesc="Admin login" user="admin"',
+]
+
+
+def test_compact_record_is_dict_like():
+    compactor = RecordCompactor(interner=Interner())
+    for entry in LogLoader.re_parse_lines(lines=LINES):
+        record = compactor(dict(entry))
+        assert isinstance(record, CompactRecord)
+        assert list(record.keys()) == list(entry.keys())
+        assert list(record.values()) == list(entry.values())
+        assert list(record.items()) == list(entry.items())
+        assert record.get('srcip') == entry.get('srcip')
+        assert record.get('missing', 'default') == 'default'
+        assert record == entry
+        assert record.to_dict() == entry
+        assert len(record) == len(entry)
+        assert 'date' in record and 'missing' not in record
+
+
+def test_compact_records_to_df_keeps_order():
+    entries = list(LogLoader.re_parse_lines(lines=LINES))
+    records = list(map(RecordCompactor(interner=Interner()), (dict(x) for x in entries)))
+    df = compact_records_to_df(records)
+    assert df['time'].tolist() == [x['time'] for x in entries]
+    assert df.loc[2, 'user'] == 'admin'
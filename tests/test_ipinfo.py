@@ -0,0 +1,41 @@
+import gzip
+
+import pandas as pd
+import pytest
+
+from ftnt_log_parser.analytics.ipinfo_loader import IpInfoIndex
+
+ROWS = [
+    ('1.0.0.0', '1.0.0.255', 'AU', 'AS13335'),
+    ('::', '::', 'ZZ', 'AS0'),
+    ('2001:db8::', '2001:db8::', 'XA', 'AS1'),
+    ('2001:db8::1', '2001:db8::ff00', 'XB', 'AS2'),
+    ('2001:db9::100', '2001:db9::ffff', 'XC', 'AS3'),
+]
+
+
+@pytest.fixture
+def index(tmp_path) -> IpInfoIndex:
+    path = tmp_path / 'country_asn.csv.gz'
+    with gzip.open(path, mode='wt') as f:
+        f.write('start_ip,end_ip,country,asn\n')
+        f.writelines(','.join(x) + '\n' for x in ROWS)
+    return IpInfoIndex.from_csv(path=path)
+
+
+@pytest.mark.parametrize('ip, country', [
+    ('::', 'ZZ'),
+    ('2001:db8::', 'XA'),
+    ('2001:db8::1', 'XB'),
+    ('2001:db8::ff00', 'XB'),
+    ('2001:db8::ff01', None),
+    ('2001:db9::100', 'XC'),
+    ('2001:db9::ff', None),
+    ('1.0.0.0', 'AU'),
+    ('1.0.1.0', None),
+    ('not-an-ip', None),
+])
+def test_scalar_and_vectorized_lookup_agree(index, ip, country):
+    position = index.lookup_position(ip)
+    assert (index.records.iloc[position]['country'] if position >= 0 else None) == country
+    assert index.lookup_positions(pd.Series([ip]))[0] == position